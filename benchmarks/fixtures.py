@@ -0,0 +1,230 @@
+"""
+Synthetic inputs for the benchmarks, sized by a Scale (number of BAs, days, interval length).
+
+Everything is generated from a fixed seed, so a given scale always produces the same data.
+"""
+
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from power_dashboard.emission_factors import FUEL_CODES
+
+START = pd.Timestamp("2024-01-01")
+SEED = 20240101
+
+
+@dataclass(frozen=True)
+class Scale:
+    n_bas: int
+    days: int
+    interval_minutes: int = 60
+
+    @property
+    def hours(self) -> pd.DatetimeIndex:
+        return pd.date_range(START, periods=self.days * 24, freq="h")
+
+    @property
+    def start_date(self) -> str:
+        return START.strftime("%Y-%m-%dT%H")
+
+    @property
+    def end_date(self) -> str:
+        return self.hours[-1].strftime("%Y-%m-%dT%H")
+
+
+SCALES = {
+    "small": Scale(n_bas=4, days=7, interval_minutes=60),
+    "medium": Scale(n_bas=16, days=30, interval_minutes=15),
+    "large": Scale(n_bas=64, days=365, interval_minutes=15),
+}
+
+
+def balancing_authorities(n_bas: int) -> List[str]:
+    return [f"B{i:03d}" for i in range(n_bas)]
+
+
+def _neighbours(bas: List[str], ba: str) -> List[str]:
+    """
+    Each BA trades with the next two BAs around a ring (fewer if there are not enough BAs)
+    """
+    position = bas.index(ba)
+    return [
+        bas[(position + step) % len(bas)]
+        for step in (1, 2)
+        if (position + step) % len(bas) != position
+    ]
+
+
+def eia_rows(
+    url_segment: str,
+    facets: Dict[str, List[str]],
+    scale: Scale,
+    hours: Optional[pd.DatetimeIndex] = None,
+) -> List[dict]:
+    """
+    Rows in the shape the EIA v2 RTO API returns them (newest period first), for the BAs in ``facets``
+    and the scale's hours (or ``hours``)
+    """
+    rng = np.random.default_rng(SEED)
+    bas = balancing_authorities(scale.n_bas)
+    periods = (scale.hours if hours is None else hours).strftime("%Y-%m-%dT%H")[::-1]
+    rows = []
+    if url_segment == "region-data":
+        types = [("D", "Demand"), ("NG", "Net generation"), ("TI", "Total interchange")]
+        for period in periods:
+            for ba in facets["respondent"]:
+                for type_code, type_name in types:
+                    rows.append(
+                        {
+                            "period": period,
+                            "respondent": ba,
+                            "respondent-name": f"{ba} Balancing Authority",
+                            "type": type_code,
+                            "type-name": type_name,
+                            "value": str(int(rng.integers(100, 5000))),
+                            "value-units": "megawatthours",
+                        }
+                    )
+    elif url_segment == "fuel-type-data":
+        for period in periods:
+            for ba in facets["respondent"]:
+                for fuel in FUEL_CODES:
+                    rows.append(
+                        {
+                            "period": period,
+                            "respondent": ba,
+                            "respondent-name": f"{ba} Balancing Authority",
+                            "fueltype": fuel,
+                            "type-name": fuel,
+                            "value": str(int(rng.integers(0, 1000))),
+                            "value-units": "megawatthours",
+                        }
+                    )
+    elif url_segment == "interchange-data":
+        for period in periods:
+            for toba in facets["toba"]:
+                for fromba in _neighbours(bas, toba):
+                    rows.append(
+                        {
+                            "period": period,
+                            "fromba": fromba,
+                            "fromba-name": f"{fromba} Balancing Authority",
+                            "toba": toba,
+                            "toba-name": f"{toba} Balancing Authority",
+                            "value": str(int(rng.integers(-500, 500))),
+                            "value-units": "megawatthours",
+                        }
+                    )
+    else:
+        raise ValueError(f"Unexpected url_segment: {url_segment}")
+    return rows
+
+
+class FakeEIA:
+    """
+    Stands in for http_client.get against the EIA API, serving pages of eia_rows from memory
+    """
+
+    def __init__(self, scale: Scale, page_size: int = 5000):
+        self.scale = scale
+        self.page_size = page_size
+        self._rows = {}
+
+    def _rows_for(self, url: str, params: dict) -> List[dict]:
+        url_segment = url.split("/rto/")[1].split("/")[0]
+        key = (url_segment, json.dumps(params["facets"], sort_keys=True))
+        if key not in self._rows:
+            self._rows[key] = eia_rows(url_segment, params["facets"], self.scale)
+        return self._rows[key]
+
+    def get(self, url, headers=None, **kwargs):
+        params = json.loads(headers["X-Params"])
+        rows = self._rows_for(url, params)
+        offset = params["offset"]
+        page = {
+            "response": {
+                "total": str(len(rows)),
+                "data": rows[offset : offset + self.page_size],
+            }
+        }
+        return _FakeResponse(page)
+
+
+class _FakeResponse:
+    status_code = 200
+
+    def __init__(self, payload: dict):
+        self.payload = payload
+
+    def json(self) -> dict:
+        return self.payload
+
+
+def bulk_files(directory: Path, scale: Scale, n_files: int = 4) -> Path:
+    """
+    gridemissions-style wide co2i CSVs, one per consecutive slice of the period, with a day of overlap
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(SEED)
+    hours = scale.hours
+    columns = [f"CO2i_{ba}_D" for ba in balancing_authorities(scale.n_bas)]
+    for file_number, chunk in enumerate(np.array_split(np.arange(len(hours)), n_files)):
+        chunk = np.arange(max(chunk[0] - 24, 0), chunk[-1] + 1)
+        frame = pd.DataFrame(
+            rng.uniform(50, 900, (len(chunk), len(columns))),
+            index=hours[chunk],
+            columns=columns,
+        )
+        frame.to_csv(directory / f"EBA_{file_number:02d}_co2i.csv")
+    return directory
+
+
+def gridemissions_history(scale: Scale) -> pd.DataFrame:
+    """
+    Hourly history for one region in the shape the Forecast tab analyses (period, co2_intensity, local_time)
+    """
+    rng = np.random.default_rng(SEED)
+    hours = scale.hours.tz_localize("UTC")
+    daily_cycle = 100 * np.sin(2 * np.pi * hours.hour / 24)
+    history = pd.DataFrame(
+        {
+            "period": hours,
+            "co2_intensity": 400 + daily_cycle + rng.normal(0, 30, len(hours)),
+        }
+    )
+    history["local_time"] = history["period"].dt.tz_convert("America/New_York")
+    return history
+
+
+def greenbutton_xml(path: Path, scale: Scale) -> Path:
+    """
+    A Green Button ESPI export with one IntervalReading per interval over the scale's days
+    """
+    n_readings = scale.days * 24 * 60 // scale.interval_minutes
+    rng = np.random.default_rng(SEED)
+    starts = (
+        int(START.timestamp()) + np.arange(n_readings) * scale.interval_minutes * 60
+    )
+    values = rng.integers(0, 5000, n_readings)
+    duration = scale.interval_minutes * 60
+    with open(path, "w") as f:
+        f.write(
+            '<?xml version="1.0" encoding="UTF-8"?>\n<feed xmlns="http://www.w3.org/2005/Atom">\n'
+        )
+        f.write(
+            '<entry><content><ReadingType xmlns="http://naesb.org/espi">'
+            "<powerOfTenMultiplier>0</powerOfTenMultiplier><uom>72</uom></ReadingType></content></entry>\n"
+        )
+        f.write('<entry><content><IntervalBlock xmlns="http://naesb.org/espi">\n')
+        for start, value in zip(starts, values):
+            f.write(
+                f"<IntervalReading><timePeriod><duration>{duration}</duration><start>{start}</start></timePeriod>"
+                f"<value>{value}</value></IntervalReading>\n"
+            )
+        f.write("</IntervalBlock></content></entry>\n</feed>\n")
+    return path
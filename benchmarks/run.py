@@ -0,0 +1,319 @@
+"""
+Benchmarks for the power_dashboard hot paths.
+
+Each benchmark builds its fixture (untimed), runs once to warm up, is timed over ``--repeats``
+runs (median wall time), then run once more under tracemalloc for peak Python memory.  Results are
+compared with benchmarks/baseline.json for the same scale and anything slower or bigger than the
+tolerance is flagged, with a non-zero exit status.
+
+Wall times depend on the host, so each run also times a fixed calibration workload and times are
+compared as multiples of it ("relative_time").  That absorbs most of the difference between
+machines, but not all of it: when the baseline was recorded on a different kind of machine, time
+regressions are only reported as warnings.  Memory peaks are compared as they are.
+
+    python -m benchmarks.run --scale medium
+    python -m benchmarks.run --scale small --update-baseline
+"""
+
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict
+from functools import partial
+from pathlib import Path
+from typing import Callable, Dict
+from unittest import mock
+
+import click
+import numpy as np
+import pandas as pd
+
+from benchmarks.fixtures import (
+    SCALES,
+    FakeEIA,
+    Scale,
+    bulk_files,
+    greenbutton_xml,
+    gridemissions_history,
+)
+
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+TIME_TOLERANCE = 0.25
+CALIBRATION_REPEATS = 7
+MEMORY_TOLERANCE = 0.10
+
+BENCHMARKS: Dict[str, Callable] = {}
+
+
+def benchmark(name: str):
+    """
+    Register a setup function: setup(scale, workdir) builds fixtures and returns the callable to measure
+    """
+
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+
+    return register
+
+
+@benchmark("eia_page_assembly")
+def _eia_page_assembly(scale: Scale, workdir: Path):
+    from power_dashboard import eia_api, http_client
+
+    fake = FakeEIA(scale)
+    facets = {"respondent": [f"B{i:03d}" for i in range(scale.n_bas)]}
+
+    def run():
+        with mock.patch.object(http_client, "get", fake.get):
+            eia_api.get_eia_timeseries(
+                "fuel-type-data",
+                facets,
+                value_column_name="Generation (MWh)",
+                start_date=scale.start_date,
+                end_date=scale.end_date,
+                frequency="hourly",
+            )
+
+    return run
+
+
+@benchmark("co2_data_hourly")
+def _co2_data_hourly(scale: Scale, workdir: Path):
+    from power_dashboard import eia_api, http_client
+
+    fake = FakeEIA(scale)
+    uncached = partial(eia_api.get_eia_timeseries_cached, use_cache=False)
+
+    def run():
+        with mock.patch.object(http_client, "get", fake.get), mock.patch.object(
+            eia_api, "get_eia_timeseries_cached", uncached
+        ):
+            eia_api.get_co2_data_hourly(
+                "B000", start_date=scale.start_date, end_date=scale.end_date
+            )
+
+    return run
+
+
+@benchmark("load_bulk")
+def _load_bulk(scale: Scale, workdir: Path):
+    from power_dashboard.gridemissions_utils import load_bulk
+
+    directory = bulk_files(workdir / "gridemissions", scale)
+    return partial(load_bulk, directory, "co2i")
+
+
+@benchmark("forecast_tab_windows")
+def _forecast_tab_windows(scale: Scale, workdir: Path):
+    from power_dashboard.scheduling import best_windows
+
+    history = gridemissions_history(scale)
+    forecast = history.head(24)
+
+    def run():
+        # What the Forecast tab computes: best window per day over the history, then over the forecast
+        best_windows(history, "co2_intensity", "local_time", lengths=range(1, 13))
+        best_windows(
+            forecast, "co2_intensity", "local_time", lengths=range(1, 13), by_day=False
+        )
+
+    return run
+
+
+@benchmark("greenbutton_parse")
+def _greenbutton_parse(scale: Scale, workdir: Path):
+    from power_dashboard.greenbutton_stream import parse_interval_readings
+
+    path = greenbutton_xml(workdir / "greenbutton.xml", scale)
+    return partial(parse_interval_readings, str(path))
+
+
+def measure(workload: Callable, repeats: int) -> dict:
+    with contextlib.redirect_stdout(io.StringIO()):
+        workload()
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            workload()
+            timings.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        workload()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {"time_s": statistics.median(timings), "peak_mb": peak / 1024**2}
+
+
+def calibrate(repeats: int = CALIBRATION_REPEATS) -> float:
+    """
+    Median seconds this host takes for a fixed mix of pandas and pure-Python work like the benchmarks'
+    """
+    rng = np.random.default_rng(0)
+    values = pd.Series(rng.random(200_000))
+    keys = rng.integers(0, 1000, len(values))
+    items = values.tolist()
+
+    def workload():
+        values.groupby(keys).agg(["sum", "max"])
+        sorted(items)
+        {index: value for index, value in enumerate(items)}
+
+    workload()
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        workload()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def machine() -> str:
+    return f"{platform.machine()} {platform.python_implementation()} {platform.python_version()}"
+
+
+def scale_key(scale: Scale) -> str:
+    return ",".join(f"{key}={value}" for key, value in asdict(scale).items())
+
+
+def compare(
+    results: dict, baseline: dict, time_tolerance: float, memory_tolerance: float
+) -> list:
+    """
+    Names and details of benchmarks that exceed their baseline by more than the tolerance
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for metric, tolerance in [
+            ("relative_time", time_tolerance),
+            ("peak_mb", memory_tolerance),
+        ]:
+            if metric not in baseline[name]:
+                continue
+            limit = baseline[name][metric] * (1 + tolerance)
+            if result[metric] > limit:
+                regressions.append(
+                    f"{name}: {metric} {result[metric]:.4g} > {limit:.4g} (baseline {baseline[name][metric]:.4g})"
+                )
+    return regressions
+
+
+@click.command()
+@click.option(
+    "--scale",
+    "scale_name",
+    type=click.Choice(list(SCALES)),
+    default="small",
+    show_default=True,
+)
+@click.option(
+    "--n-bas", type=int, help="Override the scale's number of balancing authorities"
+)
+@click.option("--days", type=int, help="Override the scale's number of days")
+@click.option(
+    "--interval-minutes", type=int, help="Override the scale's Green Button interval"
+)
+@click.option(
+    "--only",
+    multiple=True,
+    type=click.Choice(list(BENCHMARKS)),
+    help="Run only these benchmarks",
+)
+@click.option("--repeats", default=5, show_default=True)
+@click.option(
+    "--update-baseline",
+    is_flag=True,
+    help="Record these results as the baseline for this scale",
+)
+@click.option("--time-tolerance", default=TIME_TOLERANCE, show_default=True)
+@click.option("--memory-tolerance", default=MEMORY_TOLERANCE, show_default=True)
+def main(
+    scale_name,
+    n_bas,
+    days,
+    interval_minutes,
+    only,
+    repeats,
+    update_baseline,
+    time_tolerance,
+    memory_tolerance,
+):
+    scale = SCALES[scale_name]
+    overrides = {"n_bas": n_bas, "days": days, "interval_minutes": interval_minutes}
+    scale = Scale(
+        **{
+            **asdict(scale),
+            **{key: value for key, value in overrides.items() if value is not None},
+        }
+    )
+    os.environ.setdefault("EIA_API_KEY", "benchmark")
+    # Keep the report readable; the fixtures deliberately trigger the pipeline's data-quality warnings
+    logging.getLogger("power_dashboard").setLevel(logging.CRITICAL)
+
+    calibration_s = calibrate()
+    click.echo(f"{'calibration':<24} {calibration_s * 1000:10.1f} ms")
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in only or BENCHMARKS:
+            try:
+                workload = BENCHMARKS[name](scale, Path(workdir))
+            except ImportError as e:
+                click.echo(f"{name:<24} skipped ({e})")
+                continue
+            results[name] = measure(workload, repeats)
+            results[name]["relative_time"] = results[name]["time_s"] / calibration_s
+            click.echo(
+                f"{name:<24} {results[name]['time_s'] * 1000:10.1f} ms {results[name]['peak_mb']:10.1f} MB"
+            )
+
+    baselines = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+    key = scale_key(scale)
+    if update_baseline:
+        baselines[key] = {
+            "machine": machine(),
+            "calibration_s": calibration_s,
+            "benchmarks": {**baselines.get(key, {}).get("benchmarks", {}), **results},
+        }
+        BASELINE_PATH.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+        click.echo(f"Updated baseline for {key}")
+        return
+
+    if key not in baselines:
+        click.echo(f"No baseline for {key}; run with --update-baseline to record one")
+        return
+    regressions = compare(
+        results, baselines[key]["benchmarks"], time_tolerance, memory_tolerance
+    )
+    if baselines[key].get("machine") != machine():
+        # Calibration doesn't fully cancel out a different CPU or Python, so don't fail the run on timings
+        click.echo(
+            f"Baseline was recorded on {baselines[key].get('machine')}, not {machine()}: time checks only warn"
+        )
+        for regression in [
+            regression for regression in regressions if "relative_time" in regression
+        ]:
+            click.echo(f"WARNING {regression}")
+        regressions = [
+            regression
+            for regression in regressions
+            if "relative_time" not in regression
+        ]
+    for regression in regressions:
+        click.echo(f"REGRESSION {regression}")
+    if regressions:
+        sys.exit(1)
+    click.echo(f"No regressions against the baseline for {key}")
+
+
+if __name__ == "__main__":
+    main()
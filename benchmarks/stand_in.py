@@ -0,0 +1,655 @@
+"""
+Local stand-in for the services the dashboard calls, for offline profiling and load testing.
+
+One HTTP server answers for all of them under separate path prefixes:
+
+    /eia/...             EIA v2 RTO API (X-Params header, 5000-row pages with "total")
+    /electricitymaps/... Electricity Maps zones, carbon-intensity/history, power-breakdown/latest
+    /maps/api/geocode/   Google geocoding
+    /rest/v1/<table>     Supabase (PostgREST) electricitymaps-hourly and gridemissions-ts
+
+Point the app at it with the environment variables printed on start-up (and the Supabase URL in
+.streamlit/secrets.toml; googlemaps insists on a key starting with "AIza", any such key works).
+
+Modes:
+    synthetic  responses generated from benchmarks.fixtures (default)
+    record     requests are forwarded to the real services and the responses saved as cassettes
+    replay     responses are served from cassettes, falling back to synthetic ones if not recorded
+
+Every response can be delayed (--latency-ms, plus exponential --jitter-ms for a long tail) and a
+fraction replaced by an error status (--error-rate, --error-status), per service if needed, so
+the effect of a slow or flaky upstream on the app can be measured.  GET /_stand_in/stats reports
+per-service request counts, injected errors and latency percentiles.
+
+    python -m benchmarks.stand_in --port 8765 --latency-ms 150 --jitter-ms 100 --error-rate 0.02
+"""
+
+import hashlib
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import click
+import numpy as np
+import pandas as pd
+import requests
+
+from benchmarks.fixtures import Scale, balancing_authorities, eia_rows
+
+SERVICES = {
+    "eia": "/eia/",
+    "electricitymaps": "/electricitymaps/",
+    "geocode": "/maps/api/geocode/",
+    "supabase": "/rest/v1/",
+}
+UPSTREAMS = {
+    "eia": "https://api.eia.gov/v2/",
+    "electricitymaps": "https://api.electricitymap.org/v3/",
+    "geocode": "https://maps.googleapis.com/maps/api/geocode/",
+}
+# Query parameters that carry API keys: never part of a cassette key and never written to a cassette,
+# including where EIA echoes them back in a response body's request.params
+SECRET_PARAMS = {"api_key", "key"}
+EIA_PAGE_SIZE = 5000
+ZONES = {
+    "US-NE-ISNE": "ISO New England",
+    "US-NW-WACM": "Western Area Power Administration - Rocky Mountain Region",
+    "US-CAL-CISO": "California Independent System Operator",
+    "US-MIDA-PJM": "PJM Interconnection",
+}
+
+
+@dataclass
+class Fault:
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 503
+
+
+@dataclass
+class StandInConfig:
+    mode: str = "synthetic"
+    cassette_dir: Path = Path("benchmarks/cassettes")
+    scale: Scale = Scale(n_bas=8, days=14)
+    fault: Fault = field(default_factory=Fault)
+    # Per-service overrides of ``fault``, keyed by SERVICES name
+    service_faults: Dict[str, Fault] = field(default_factory=dict)
+    supabase_upstream: Optional[str] = None
+    seed: int = 0
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def record(self, service: str, seconds: float, injected_error: bool):
+        with self.lock:
+            self.latencies.setdefault(service, []).append(seconds)
+            self.errors[service] = self.errors.get(service, 0) + int(injected_error)
+
+    def summary(self) -> dict:
+        with self.lock:
+            return {
+                service: {
+                    "requests": len(latencies),
+                    "injected_errors": self.errors[service],
+                    **{
+                        f"p{q}_ms": float(np.percentile(latencies, q) * 1000)
+                        for q in (50, 95, 99)
+                    },
+                }
+                for service, latencies in self.latencies.items()
+            }
+
+
+def cassette_key(
+    method: str, path: str, query: List[Tuple[str, str]], x_params: Optional[str]
+) -> str:
+    query = sorted((key, value) for key, value in query if key not in SECRET_PARAMS)
+    payload = json.dumps(
+        [method, path, query, json.loads(x_params) if x_params else None],
+        sort_keys=True,
+    )
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def scrub_body(body: str) -> str:
+    """
+    A response body without the API keys EIA echoes back in ``request.params``
+    """
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return body
+    request = payload.get("request") if isinstance(payload, dict) else None
+    params = request.get("params") if isinstance(request, dict) else None
+    if not isinstance(params, dict) or not SECRET_PARAMS & params.keys():
+        return body
+    for name in SECRET_PARAMS:
+        params.pop(name, None)
+    return json.dumps(payload)
+
+
+class SyntheticData:
+    """
+    Responses generated on the fly for the EIA and Electricity Maps APIs, and in-memory Supabase tables
+    """
+
+    def __init__(self, scale: Scale, seed: int = 0):
+        self.scale = scale
+        self.rng = np.random.default_rng(seed)
+        self._eia_rows = {}
+        now = pd.Timestamp.now(tz="UTC").floor("h")
+        self.hours = pd.date_range(now - pd.Timedelta(days=scale.days), now, freq="h")
+        self.tables = {
+            "electricitymaps-hourly": self._electricitymaps_hourly(),
+            "gridemissions-ts": self._gridemissions_ts(),
+        }
+
+    def _intensity(self, hours: pd.DatetimeIndex, zone: str) -> np.ndarray:
+        base = 200 + (int(hashlib.sha1(zone.encode()).hexdigest(), 16) % 300)
+        return np.round(
+            base
+            + 80 * np.sin(2 * np.pi * (hours.hour - 6) / 24)
+            + self.rng.normal(0, 15, len(hours))
+        )
+
+    def _history(self, zone: str, end: pd.Timestamp) -> List[dict]:
+        hours = pd.date_range(end - pd.Timedelta(hours=23), end, freq="h")
+        return [
+            {
+                "zone": zone,
+                "carbonIntensity": int(value),
+                "datetime": hour.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+                "updatedAt": (hour + pd.Timedelta(minutes=50)).strftime(
+                    "%Y-%m-%dT%H:%M:%S.000Z"
+                ),
+                "createdAt": (hour + pd.Timedelta(minutes=5)).strftime(
+                    "%Y-%m-%dT%H:%M:%S.000Z"
+                ),
+                "emissionFactorType": "lifecycle",
+                "isEstimated": False,
+                "estimationMethod": None,
+            }
+            for hour, value in zip(hours, self._intensity(hours, zone))
+        ]
+
+    def _electricitymaps_hourly(self) -> List[dict]:
+        rows = []
+        for hour in self.hours[24:]:
+            for zone in ZONES:
+                rows.append(
+                    {
+                        "id": len(rows) + 1,
+                        "created_at": hour.isoformat(),
+                        "zone": zone,
+                        "testing": False,
+                        "carbon_intensity_raw": {
+                            "zone": zone,
+                            "history": self._history(zone, hour),
+                        },
+                    }
+                )
+        return rows
+
+    def _gridemissions_ts(self) -> List[dict]:
+        rows = []
+        for zone in ZONES:
+            region = f"CO2i_{zone.split('-')[-1]}_D"
+            for hour, value in zip(self.hours, self._intensity(self.hours, zone)):
+                rows.append(
+                    {
+                        "id": len(rows) + 1,
+                        "period": hour.isoformat(),
+                        "region": region,
+                        "co2_intensity": value,
+                    }
+                )
+        return rows
+
+    def zone_for(self, query: dict) -> str:
+        if "zone" in query:
+            return query["zone"]
+        position = round(
+            float(query.get("lat", 0)) * 10 + float(query.get("lon", 0)) * 10
+        )
+        return list(ZONES)[position % len(ZONES)]
+
+    def eia(self, path: str, x_params: dict) -> dict:
+        url_segment = path.rstrip("/").split("/")[-2]
+        facets = x_params.get("facets", {})
+        key = (
+            url_segment,
+            json.dumps(facets, sort_keys=True),
+            x_params.get("start"),
+            x_params.get("end"),
+        )
+        if key not in self._eia_rows:
+            if not any(facets.values()):
+                facets = {"respondent": balancing_authorities(self.scale.n_bas)}
+                facets["toba"] = facets["respondent"]
+            # EIA accepts YYYY-MM-DD or YYYY-MM-DDTHH; an end date without an hour covers that whole day
+            start = pd.Timestamp(
+                x_params.get("start") or self.hours[0].tz_localize(None)
+            )
+            end = pd.Timestamp(x_params.get("end") or self.hours[-1].tz_localize(None))
+            if "T" not in (x_params.get("end") or "T"):
+                end += pd.Timedelta(hours=23)
+            hours = pd.date_range(start, end, freq="h")
+            self._eia_rows[key] = eia_rows(url_segment, facets, self.scale, hours)
+        rows = self._eia_rows[key]
+        offset = int(x_params.get("offset", 0))
+        length = min(int(x_params.get("length", EIA_PAGE_SIZE)), EIA_PAGE_SIZE)
+        return {
+            "response": {
+                "total": str(len(rows)),
+                "data": rows[offset : offset + length],
+            }
+        }
+
+    def electricitymaps(self, path: str, query: dict):
+        endpoint = path[len(SERVICES["electricitymaps"]) :].strip("/")
+        if endpoint == "zones":
+            return {zone: {"zoneName": name} for zone, name in ZONES.items()}
+        zone = self.zone_for(query)
+        if endpoint == "carbon-intensity/history":
+            return {"zone": zone, "history": self._history(zone, self.hours[-1])}
+        if endpoint == "power-breakdown/latest":
+            breakdown = dict(
+                zip(
+                    ["nuclear", "gas", "wind", "solar", "hydro", "coal"],
+                    self.rng.integers(0, 5000, 6),
+                )
+            )
+            return {
+                "zone": zone,
+                "datetime": self.hours[-1].strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+                "powerConsumptionBreakdown": {
+                    source: int(value) for source, value in breakdown.items()
+                },
+                "fossilFreePercentage": int(self.rng.integers(20, 90)),
+                "renewablePercentage": int(self.rng.integers(10, 70)),
+            }
+        return None
+
+    def geocode(self, query: dict) -> dict:
+        address = query.get("address", "")
+        digest = int(hashlib.sha1(address.encode()).hexdigest(), 16)
+        lat, lng = 25 + (digest % 2300) / 100, -124 + (digest // 2300 % 5700) / 100
+        return {
+            "status": "OK",
+            "results": [
+                {
+                    "formatted_address": address or "Somewhere",
+                    "geometry": {"location": {"lat": lat, "lng": lng}},
+                }
+            ],
+        }
+
+    def supabase(self, path: str, query: List[Tuple[str, str]]) -> Optional[list]:
+        table = path[len(SERVICES["supabase"]) :].strip("/")
+        if table not in self.tables:
+            return None
+        return postgrest_query(self.tables[table], query)
+
+
+def _coerce(value):
+    """
+    Comparable form of a PostgREST filter operand or column value
+    """
+    if isinstance(value, str):
+        if value in ("true", "false"):
+            return value == "true"
+        try:
+            return float(value)
+        except ValueError:
+            pass
+        try:
+            return pd.Timestamp(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _json_path(row: dict, expression: str):
+    column, *keys = expression.split("->")
+    value = row.get(column)
+    for key in keys:
+        value = value.get(key) if isinstance(value, dict) else None
+    return value
+
+
+OPERATORS = {
+    "eq": lambda a, b: a == b,
+    "neq": lambda a, b: a != b,
+    "gt": lambda a, b: a > b,
+    "gte": lambda a, b: a >= b,
+    "lt": lambda a, b: a < b,
+    "lte": lambda a, b: a <= b,
+}
+
+
+def postgrest_query(rows: List[dict], query: List[Tuple[str, str]]) -> list:
+    """
+    The subset of PostgREST the dashboard uses: select (with aliases and -> paths), eq/neq/gt/gte/lt/lte,
+    order and limit
+    """
+    select, order, limit = "*", None, None
+    for key, value in query:
+        if key == "select":
+            select = value
+        elif key == "order":
+            order = value
+        elif key == "limit":
+            limit = int(value)
+        else:
+            operator, operand = value.split(".", 1)
+            operand = _coerce(operand)
+            rows = [
+                row
+                for row in rows
+                if row.get(key) is not None
+                and OPERATORS[operator](_coerce(row[key]), operand)
+            ]
+
+    if order:
+        column, *modifiers = order.split(".")
+        rows = sorted(
+            rows, key=lambda row: _coerce(row[column]), reverse="desc" in modifiers
+        )
+    if limit is not None:
+        rows = rows[:limit]
+    if select.strip() == "*":
+        return rows
+
+    columns = []
+    for item in select.split(","):
+        alias, _, expression = item.strip().rpartition(":")
+        columns.append((alias or expression.split("->")[-1], expression))
+    return [
+        {alias: _json_path(row, expression) for alias, expression in columns}
+        for row in rows
+    ]
+
+
+def make_handler(config: StandInConfig, data: SyntheticData, stats: Stats):
+    rng = np.random.default_rng(config.seed)
+    rng_lock = threading.Lock()
+
+    class StandInHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(
+            self, status: int, body: bytes, content_type: str = "application/json"
+        ):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_json(self, status: int, payload):
+            self._send(status, json.dumps(payload).encode())
+
+        def _service(self, path: str) -> Optional[str]:
+            return next(
+                (name for name, prefix in SERVICES.items() if path.startswith(prefix)),
+                None,
+            )
+
+        def _fault(self, service: str) -> Tuple[float, bool]:
+            fault = config.service_faults.get(service, config.fault)
+            with rng_lock:
+                jitter = (
+                    rng.exponential(fault.jitter_ms) if fault.jitter_ms > 0 else 0.0
+                )
+                error = rng.random() < fault.error_rate
+            return (fault.latency_ms + jitter) / 1000, error
+
+        def _upstream_url(self, service: str, path: str, query: str) -> str:
+            base = (
+                config.supabase_upstream.rstrip("/") + "/rest/v1/"
+                if service == "supabase"
+                else UPSTREAMS[service]
+            )
+            return (
+                base + path[len(SERVICES[service]) :] + (f"?{query}" if query else "")
+            )
+
+        def _record(
+            self, service: str, path: str, query: str, key: str
+        ) -> Tuple[int, bytes, str]:
+            # Auth headers are forwarded to the upstream but not stored
+            headers = {
+                name: value
+                for name, value in self.headers.items()
+                if name.lower() not in ("host", "content-length")
+            }
+            response = requests.get(
+                self._upstream_url(service, path, query), headers=headers, timeout=60
+            )
+            cassette = {
+                "request": {
+                    "path": path,
+                    "query": [
+                        (k, v) for k, v in parse_qsl(query) if k not in SECRET_PARAMS
+                    ],
+                    "x_params": self.headers.get("X-Params"),
+                },
+                "status": response.status_code,
+                "content_type": response.headers.get(
+                    "Content-Type", "application/json"
+                ),
+                "body": scrub_body(response.text),
+            }
+            config.cassette_dir.mkdir(parents=True, exist_ok=True)
+            (config.cassette_dir / f"{key}.json").write_text(
+                json.dumps(cassette, indent=1)
+            )
+            return response.status_code, response.content, cassette["content_type"]
+
+        def _synthetic(self, service: str, path: str, query: List[Tuple[str, str]]):
+            if service == "eia":
+                return data.eia(path, json.loads(self.headers.get("X-Params") or "{}"))
+            if service == "electricitymaps":
+                return data.electricitymaps(path, dict(query))
+            if service == "geocode":
+                return data.geocode(dict(query))
+            return data.supabase(path, query)
+
+        def do_GET(self):
+            started = time.perf_counter()
+            url = urlsplit(self.path)
+            if url.path == "/_stand_in/stats":
+                self._send_json(200, stats.summary())
+                return
+            service = self._service(url.path)
+            if service is None:
+                self._send_json(404, {"message": f"No stand-in for {url.path}"})
+                return
+
+            delay, error = self._fault(service)
+            time.sleep(delay)
+            query = parse_qsl(url.query, keep_blank_values=True)
+            key = cassette_key("GET", url.path, query, self.headers.get("X-Params"))
+            cassette_path = config.cassette_dir / f"{key}.json"
+
+            if error:
+                fault = config.service_faults.get(service, config.fault)
+                self._send_json(fault.error_status, {"message": "Injected error"})
+            elif config.mode == "record":
+                self._send(*self._record(service, url.path, url.query, key))
+            elif config.mode == "replay" and cassette_path.exists():
+                cassette = json.loads(cassette_path.read_text())
+                self._send(
+                    cassette["status"],
+                    cassette["body"].encode(),
+                    cassette["content_type"],
+                )
+            else:
+                payload = self._synthetic(service, url.path, query)
+                if payload is None:
+                    self._send_json(
+                        404, {"message": f"No synthetic response for {url.path}"}
+                    )
+                else:
+                    self._send_json(200, payload)
+            stats.record(service, time.perf_counter() - started, error)
+
+    return StandInHandler
+
+
+def serve(
+    config: StandInConfig, host: str = "127.0.0.1", port: int = 8765
+) -> ThreadingHTTPServer:
+    """
+    Start the stand-in on a background thread; call .shutdown() on the result to stop it
+    """
+    server = ThreadingHTTPServer(
+        (host, port),
+        make_handler(config, SyntheticData(config.scale, config.seed), Stats()),
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def environment(host: str, port: int) -> Dict[str, str]:
+    """
+    Environment variables that point the dashboard's clients at a stand-in on host:port
+    """
+    base = f"http://{host}:{port}"
+    return {
+        "EIA_BASE_URL": f"{base}/eia/electricity/rto/",
+        "ELECTRICITYMAPS_BASE_URL": f"{base}/electricitymaps/",
+        "GOOGLEMAPS_BASE_URL": base,
+        "SUPABASE_URL": base,
+    }
+
+
+def _parse_service_faults(values, fault: Fault) -> Dict[str, Fault]:
+    """
+    --service-fault eia:latency_ms=500,error_rate=0.1 -> {"eia": Fault(latency_ms=500, error_rate=0.1, ...)}
+    """
+    service_faults = {}
+    for value in values:
+        service, _, settings = value.partition(":")
+        if service not in SERVICES:
+            raise click.BadParameter(
+                f"Unknown service {service}; choose from {', '.join(SERVICES)}"
+            )
+        overrides = dict(
+            setting.split("=") for setting in settings.split(",") if setting
+        )
+        service_faults[service] = Fault(
+            **{
+                name: type(getattr(fault, name))(
+                    overrides.get(name, getattr(fault, name))
+                )
+                for name in Fault.__dataclass_fields__
+            }
+        )
+    return service_faults
+
+
+@click.command()
+@click.option("--host", default="127.0.0.1", show_default=True)
+@click.option("--port", default=8765, show_default=True)
+@click.option(
+    "--mode",
+    type=click.Choice(["synthetic", "record", "replay"]),
+    default="synthetic",
+    show_default=True,
+)
+@click.option("--cassette-dir", default="benchmarks/cassettes", show_default=True)
+@click.option("--supabase-upstream", help="Real Supabase project URL to record from")
+@click.option(
+    "--n-bas",
+    default=8,
+    show_default=True,
+    help="Synthetic EIA BAs when no facets are given",
+)
+@click.option("--days", default=14, show_default=True, help="Days of synthetic history")
+@click.option(
+    "--latency-ms",
+    default=0.0,
+    show_default=True,
+    help="Fixed delay added to every response",
+)
+@click.option(
+    "--jitter-ms",
+    default=0.0,
+    show_default=True,
+    help="Mean of an exponential extra delay (long tail)",
+)
+@click.option(
+    "--error-rate",
+    default=0.0,
+    show_default=True,
+    help="Fraction of requests answered with --error-status",
+)
+@click.option("--error-status", default=503, show_default=True)
+@click.option(
+    "--service-fault",
+    multiple=True,
+    help="Per-service override, e.g. eia:latency_ms=500,error_rate=0.1",
+)
+@click.option("--seed", default=0, show_default=True)
+def main(
+    host,
+    port,
+    mode,
+    cassette_dir,
+    supabase_upstream,
+    n_bas,
+    days,
+    latency_ms,
+    jitter_ms,
+    error_rate,
+    error_status,
+    service_fault,
+    seed,
+):
+    fault = Fault(
+        latency_ms=latency_ms,
+        jitter_ms=jitter_ms,
+        error_rate=error_rate,
+        error_status=error_status,
+    )
+    config = StandInConfig(
+        mode=mode,
+        cassette_dir=Path(cassette_dir),
+        scale=Scale(n_bas=n_bas, days=days),
+        fault=fault,
+        service_faults=_parse_service_faults(service_fault, fault),
+        supabase_upstream=supabase_upstream,
+        seed=seed,
+    )
+    if mode == "record" and supabase_upstream is None:
+        click.echo(
+            "Supabase requests will fail in record mode without --supabase-upstream"
+        )
+    server = serve(config, host, port)
+    click.echo(
+        f"Stand-in serving {mode} responses on http://{host}:{port}; point the app at it with:"
+    )
+    for name, value in environment(host, port).items():
+        click.echo(f"  export {name}={value}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,144 +1,142 @@
 import datetime
-from functools import partial
-from typing import Tuple
 
-import googlemaps
-import matplotlib.dates as mdates
-import matplotlib.pyplot as plt
-import numpy as np
 import pandas as pd
 import streamlit as st
-from mlforecast import MLForecast
-from supabase import Client, create_client
-from timezonefinder import TimezoneFinder
-from io import StringIO
-
-from greenbutton import parse
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
+from power_dashboard.charts import bar_spec, time_series_spec
 from power_dashboard.electricity_maps import (
     get_electricity_maps_carbon_intensity,
     get_electricity_maps_power_breakdown,
     get_electricity_maps_zones,
 )
+from power_dashboard.forecast_batch import (
+    FORECAST_MODEL_PATH,
+    read_batch_forecast,
+    region_for_zone,
+)
+from power_dashboard.instrumentation import span
+from power_dashboard.scheduling import best_windows
+from power_dashboard.shared_cache import shared_cache
+from power_dashboard.supabase_history import (
+    fetch_electricitymaps_history,
+    read_gridemissions_history,
+)
+from power_dashboard.task_graph import TaskGraph
+from power_dashboard.zone_index import load_zone_index, read_zones_snapshot, timezone_at
 
-from power_dashboard.eia_api import *
+# Heavy modules (mlforecast, googlemaps, supabase, timezonefinder, the EIA client) are imported
+# where they are first used, so a rerun only pays for what the selected view needs.
 
 st.set_page_config(
     page_title="Clean Electricity Dashboard", layout="wide", page_icon=":thunderbolt:"
 )
 
-tab1, tab2, tab3 = st.tabs(["Now", "Forecast", "Personal Footprint"])
+# Unlike st.tabs, which runs every tab's body on every rerun, only the selected view is computed
+VIEWS = ["Now", "Forecast", "Personal Footprint"]
+view = st.radio("View", VIEWS, horizontal=True, label_visibility="collapsed")
+
+
+@st.cache_resource
+def get_gmaps_client():
+    from power_dashboard.geocoding import get_googlemaps_client
 
-gmaps = googlemaps.Client(key=st.secrets["googlemaps"]["api_key"])
-tf = TimezoneFinder()
+    return get_googlemaps_client(st.secrets["googlemaps"]["api_key"])
+
+
+@st.cache_resource
+def get_supabase_client():
+    from supabase import create_client
+
+    return create_client(
+        st.secrets["supabase"]["supabase_url"], st.secrets["supabase"]["supabase_key"]
+    )
 
 
-supabase_url: str = st.secrets["supabase"]["supabase_url"]
-supabase_key: str = st.secrets["supabase"]["supabase_key"]
-supabase_client: Client = create_client(supabase_url, supabase_key)
+# How much stored Electricity Maps history to show and feed the forecast model
+CARBON_INTENSITY_HISTORY = pd.Timedelta(days=14)
+# How much gridemissions history the Forecast tab analyses
+GRIDEMISSIONS_HISTORY = pd.Timedelta(days=90)
+# Google Maps terms allow caching geocoding results for at most 30 days
+GEOCODE_CACHE_SECONDS = 30 * 24 * 3600
 
 
-@st.cache_data
+# Upstream fetches go through the shared cache, so all replicas and sessions reuse one call per zone
+@span("app.get_zones")
+@shared_cache(expires=24 * 3600)
 def get_zones():
-    return get_electricity_maps_zones()
+    return read_zones_snapshot() or get_electricity_maps_zones()
 
 
-@st.cache_data(ttl=3600)
-def get_carbon_intensity(lat, lng, current_hour):
-    # current_hour is included to force the cache to update every hour
-    result = get_electricity_maps_carbon_intensity(
+@st.cache_resource
+def get_zone_index():
+    return load_zone_index()
+
+
+@span("app.lookup_zone")
+@shared_cache(expires=24 * 3600)
+def lookup_zone(lat, lng) -> str:
+    # Only for points the offline index can't place; Electricity Maps resolves the coordinates itself
+    return get_electricity_maps_power_breakdown(
         lat, lng, auth_token=st.secrets["electricitymaps"]["api_key"]
+    )["zone"]
+
+
+def locate_zone(lat, lng) -> str:
+    zone_index = get_zone_index()
+    zone = zone_index.zone_at(lat, lng) if zone_index is not None else None
+    return zone if zone is not None else lookup_zone(lat, lng)
+
+
+@span("app.get_carbon_intensity")
+@shared_cache(expires="hour")
+def get_carbon_intensity(zone: str):
+    result = get_electricity_maps_carbon_intensity(
+        zone=zone, auth_token=st.secrets["electricitymaps"]["api_key"]
     )
-    zone = result["zone"]
 
     # Check for longer history if available.
-    response = (
-        supabase_client.table("electricitymaps-hourly")
-        .select("*")
-        .eq("testing", False)
-        .eq("zone", zone)
-        .execute()
-    )
-    all_records = pd.DataFrame.from_records(
-        [
-            record
-            for resp in response.data
-            for record in resp["carbon_intensity_raw"]["history"]
-        ]
+    history = fetch_electricitymaps_history(
+        get_supabase_client(),
+        zone,
+        start=pd.Timestamp.now(tz="UTC") - CARBON_INTENSITY_HISTORY,
     )
-    if len(all_records) == 0:
+    if len(history) == 0:
         return result
     else:
-        idx = all_records.groupby(["zone", "datetime"])["updatedAt"].idxmax()
-        filtered_records = all_records.loc[idx].reset_index(drop=True)
-
-        datetime_cols = ["datetime", "createdAt", "updatedAt"]
-        filtered_records[datetime_cols] = filtered_records[datetime_cols].apply(
-            pd.to_datetime
-        )
         result = {
             "zone": zone,
-            "history": filtered_records.to_dict(orient="records"),
+            "history": history.to_dict(orient="records"),
         }
         return result
 
 
-@st.cache_data(ttl=3600)
-def get_power_breakdown(lat, lng, current_hour):
-    # current_hour is included to force the cache to update every hour
+@span("app.get_power_breakdown")
+@shared_cache(expires="hour")
+def get_power_breakdown(zone: str):
     return get_electricity_maps_power_breakdown(
-        lat, lng, auth_token=st.secrets["electricitymaps"]["api_key"]
+        zone=zone, auth_token=st.secrets["electricitymaps"]["api_key"]
     )
 
 
-@st.cache_data
+@span("app.get_gridemissions_history")
+@shared_cache(expires=24 * 3600)
 def get_gridemissions_history(region: str) -> pd.DataFrame:
-    response = (
-        supabase_client.table("gridemissions-ts")
-        .select("*")
-        .eq("region", region)
-        .execute()
+    return read_gridemissions_history(
+        get_supabase_client(), region, window=GRIDEMISSIONS_HISTORY
     )
-    try:
-        df = pd.DataFrame.from_records(response.data).set_index("id")
-        return df
-    except KeyError:
-        return pd.DataFrame()
 
 
 # Cut down gmaps API costs by cacheing results.
-@st.cache_data
+@span("app.geocode_address")
+@shared_cache(expires=GEOCODE_CACHE_SECONDS)
 def geocode_address(address: str) -> dict:
-    geocode_result = gmaps.geocode(address)
+    geocode_result = get_gmaps_client().geocode(address)
     location = geocode_result[0]["geometry"]["location"]
     location["formatted_address"] = geocode_result[0]["formatted_address"]
     return location
 
 
-def find_minimum_hour(
-    df: pd.DataFrame, value_col: str, time_col: str, window: int = 4
-) -> Tuple[datetime, datetime]:
-    """
-    Find the minimum contiguous hours of a given length in a DataFrame
-    """
-    _df = df.reset_index()
-    min_index = _df[value_col].idxmin()
-    if not np.isnan(min_index):
-        min_end = _df.loc[min_index, time_col]
-        min_start = min_end - pd.Timedelta(hours=window)
-        return (min_start, min_end)
-    else:
-        return (pd.NaT, pd.NaT)
-
-
-_func = partial(
-    find_minimum_hour,
-    value_col="rolling_avg_intensity",
-    time_col="local_time",
-    window=4,
-)
-
-
 def convert_hour_to_string(hour):
     if hour == 0:
         return "Midnight"
@@ -150,13 +148,86 @@ def convert_hour_to_string(hour):
         return f"{hour}:00 AM"
 
 
-@st.cache_data
+# A resource rather than data: the model is loaded once per process and shared, not copied on every read
+@st.cache_resource
 def load_forecast_model():
-    return MLForecast.load("models/final_model")
+    from mlforecast import MLForecast
+
+    return MLForecast.load(FORECAST_MODEL_PATH)
 
-zones = get_zones()
 
-with st.spinner("Updating..."):
+# Not hour-aligned: the batch job writes a few minutes past the hour
+@span("app.get_batch_forecast")
+@shared_cache(expires=600)
+def get_batch_forecast(region: str):
+    return read_batch_forecast(region)
+
+
+# Chart specs are cached per (zone, hour) like the data they show. Streamlit does not hash arguments whose
+# names start with an underscore, so the series themselves stay out of the cache key.
+@span("app.get_carbon_intensity_chart")
+@st.cache_data(ttl=3600)
+def get_carbon_intensity_chart(
+    zone: str, current_hour, timezone_str: str, _carbon_intensity, mean_carbon_intensity
+):
+    return time_series_spec(
+        _carbon_intensity.tail(24),
+        "time",
+        "carbonIntensity",
+        "gCO2e/kWh",
+        rule=mean_carbon_intensity,
+        rule_title="Recent Average Carbon Intensity",
+    )
+
+
+@span("app.get_start_hour_chart")
+@st.cache_data(ttl=3600)
+def get_start_hour_chart(
+    zone: str, current_hour, window_hours: int, _distribution, zone_name: str
+):
+    return bar_spec(
+        _distribution,
+        "Hour of the Day",
+        "Days",
+        title=f"Start of Minimum {window_hours}-hour Contiguous Low CO2 Intensity Periods for {zone_name}",
+    )
+
+
+@span("app.get_forecast_chart")
+@st.cache_data(ttl=3600)
+def get_forecast_chart(
+    zone: str, current_hour, timezone_str: str, _observed, _forecast, zone_name: str
+):
+    lines = pd.concat(
+        [
+            pd.DataFrame(
+                {
+                    "time": _observed["ds"],
+                    "gCO2eq/kWh": _observed["y"],
+                    "series": "Observed",
+                }
+            ),
+            pd.DataFrame(
+                {
+                    "time": _forecast["ds"],
+                    "gCO2eq/kWh": _forecast["LGBMRegressor"],
+                    "series": "Forecast",
+                }
+            ),
+        ],
+        ignore_index=True,
+    )
+    return time_series_spec(
+        lines,
+        "time",
+        "gCO2eq/kWh",
+        "Carbon Intensity (gCO2eq/kWh)",
+        series="series",
+        title=f"24-hour Forecast for {zone_name}",
+    )
+
+
+with st.spinner("Updating..."), span("app.rerun", view=view):
     address = st.sidebar.text_input("Enter your address")
 
     now = datetime.datetime.now().strftime("%Y-%m-%d %H")
@@ -164,11 +235,47 @@ with st.spinner("Updating..."):
     if address == "":
         st.stop()
 
-    location = geocode_address(address)
+    # Start each upstream call as soon as its inputs are known; reading a result waits only for its own chain.
+    # Worker threads get this session's script context so Streamlit calls work in them.
+    loader = TaskGraph(
+        initializer=add_script_run_ctx, initargs=(None, get_script_run_ctx())
+    )
+    loader.add("zones", get_zones)
+    loader.add("location", geocode_address, address)
+    # Everything after the address is keyed by zone, so every address in a zone shares the cached fetches
+    loader.add(
+        "zone",
+        lambda location: locate_zone(location["lat"], location["lng"]),
+        deps=["location"],
+    )
+    loader.add("carbon_intensity", get_carbon_intensity, deps=["zone"])
+    loader.add(
+        "timezone",
+        lambda location: timezone_at(location["lat"], location["lng"]),
+        deps=["location"],
+    )
+    # Only fetch what the selected view shows
+    if view == "Now":
+        loader.add("power_breakdown", get_power_breakdown, deps=["zone"])
+    elif view == "Forecast":
+        loader.add(
+            "gridemissions_history",
+            lambda zone: get_gridemissions_history(region_for_zone(zone)),
+            deps=["zone"],
+        )
+        loader.add(
+            "batch_forecast",
+            lambda zone: get_batch_forecast(region_for_zone(zone)),
+            deps=["zone"],
+        )
+    loader.start()
+
+    zones = loader["zones"]
+    location = loader["location"]
 
     # Get the carbon intensity data
-    result = get_carbon_intensity(location["lat"], location["lng"], now)
-    timezone_str = tf.timezone_at(lng=location["lng"], lat=location["lat"])
+    result = loader["carbon_intensity"]
+    timezone_str = loader["timezone"]
     carbon_intensity_df = pd.DataFrame.from_records(result["history"])
     localized_time = pd.to_datetime(carbon_intensity_df["datetime"]).dt.tz_convert(
         timezone_str
@@ -182,9 +289,6 @@ with st.spinner("Updating..."):
         (latest_carbon_intensity - mean_carbon_intensity) / mean_carbon_intensity * 100
     )
 
-    # Get the production breakdown data
-    power_breakdown_result = get_power_breakdown(location["lat"], location["lng"], now)
-
     with st.sidebar:
         st.markdown("### Displaying Results for:")
         st.markdown(f"**Location**: {location['formatted_address']}")
@@ -192,8 +296,11 @@ with st.spinner("Updating..."):
         st.markdown(f"**Timezone**: {timezone_str}")
         st.markdown(f"**Local Time**: {latest_time}")
 
-    with tab1:
+    if view == "Now":
         st.title("Clean Electricity Dashboard")
+        # Get the production breakdown data
+        power_breakdown_result = loader["power_breakdown"]
+
         # Display grid intensity
         m1, m2, m3 = st.columns((1, 1, 1))
         m1.metric(
@@ -238,36 +345,25 @@ with st.spinner("Updating..."):
         st.subheader(
             f"Carbon Intensity over previous 24 hrs in {zones[result['zone']]['zoneName']}"
         )
-        fig, ax = plt.subplots(figsize=(10, 3))
-
-        ax.plot(
-            localized_time.tail(24),
-            carbon_intensity_df["carbonIntensity"].tail(24),
-            label="Carbon Intensity",
-        )
-        ax.hlines(
-            mean_carbon_intensity,
-            localized_time.tail(24).min(),
-            localized_time.tail(24).max(),
-            label="Recent Average Carbon Intensity",
-            color="red",
-            linestyle="--",
+        st.vega_lite_chart(
+            get_carbon_intensity_chart(
+                result["zone"],
+                now,
+                timezone_str,
+                carbon_intensity_df.assign(time=localized_time),
+                float(mean_carbon_intensity),
+            ),
+            use_container_width=True,
         )
-        ax.legend()
-        ax.set_ylabel("gCO2e/kWh")
-        ax.set_xlabel("Time")
-
-        st.pyplot(fig)
         st.caption(
             "Data from [electricityMap API](https://api-portal.electricitymaps.com/)"
         )
 
-    with tab2:
+    elif view == "Forecast":
         st.title("Forecasted Grid Emissions")
 
-        ba_str = result["zone"].split("-")[-1]
-        region = f"CO2i_{ba_str}_D"
-        df = get_gridemissions_history(region)
+        region = region_for_zone(result["zone"])
+        df = loader["gridemissions_history"]
 
         if len(df) == 0:
             st.write(
@@ -275,32 +371,37 @@ with st.spinner("Updating..."):
             )
             st.stop()
 
+        window_hours = st.slider(
+            "Appliance run time (hours)", min_value=1, max_value=12, value=4
+        )
+
         df["local_time"] = pd.to_datetime(df.period).dt.tz_convert(timezone_str)
-        df["rolling_avg_intensity"] = df["co2_intensity"].rolling(window=4).mean()
-        start_time_by_day = df.groupby(df.local_time.dt.date).apply(
-            lambda grp: _func(df=grp)[0].hour
+        best_window_by_day = best_windows(
+            df, "co2_intensity", "local_time", lengths=[window_hours]
         )
 
-        distribution = start_time_by_day.value_counts().sort_index()
+        distribution = best_window_by_day["start"].dt.hour.value_counts().sort_index()
         st.write(
-            f"In {zones[result['zone']]['zoneName']}, the most frequent start time for a minimum 4-hour contiguous low CO2 intensity period is:"
+            f"In {zones[result['zone']]['zoneName']}, the most frequent start time for a minimum "
+            f"{window_hours}-hour contiguous low CO2 intensity period is:"
         )
         st.subheader(f"**{convert_hour_to_string(distribution.idxmax())}!!**")
 
         # Plot it
-        fig, ax = plt.subplots()
-        distribution.plot(kind="bar", ax=ax)
-        ax.set_title(
-            f"Distribution of start of Minimum 4-hour Contiguous Low CO2 Intensity Periods for {zones[result['zone']]['zoneName']}"
+        st.vega_lite_chart(
+            get_start_hour_chart(
+                result["zone"],
+                now,
+                window_hours,
+                distribution,
+                zones[result["zone"]]["zoneName"],
+            ),
+            use_container_width=True,
         )
-        ax.set_xlabel("Hour of the Day")
-
-        st.pyplot(fig)
         st.caption(
             "Data from [gridemissions](https://gridemissions.jdechalendar.su.domains/)"
         )
 
-        model = load_forecast_model()
         # carbon_intensity_df = pd.DataFrame.from_records(result["history"])
         # localized_time = pd.to_datetime(carbon_intensity_df["datetime"]).dt.tz_convert(
         #     timezone_str
@@ -312,95 +413,107 @@ with st.spinner("Updating..."):
                 "unique_id": region,
             }
         )
-        forecast = model.predict(
-            h=24,
-            new_df=X,
-        )
-        (min_start, min_end) = find_minimum_hour(forecast, "LGBMRegressor", "ds")
+        # Use the hourly batch forecast when there is a fresh one for this region, else run the model here
+        batch = loader["batch_forecast"]
+        if batch is not None and window_hours in batch[1]["length"].values:
+            forecast, windows = batch
+            forecast["ds"] = forecast["ds"].dt.tz_convert(timezone_str)
+            min_start = (
+                windows.loc[windows["length"] == window_hours, "start"]
+                .iloc[0]
+                .tz_convert(timezone_str)
+            )
+        else:
+            model = load_forecast_model()
+            with span("app.forecast_predict"):
+                forecast = model.predict(
+                    h=24,
+                    new_df=X,
+                )
+            min_start = best_windows(
+                forecast, "LGBMRegressor", "ds", lengths=[window_hours], by_day=False
+            )["start"].iloc[0]
         st.write(
-            "In the next 24 hours, forecasting finds a minimum 4-hour contiguous low CO2 intensity period starts at:"
+            f"In the next 24 hours, forecasting finds a minimum {window_hours}-hour contiguous low CO2 intensity "
+            "period starts at:"
         )
         st.subheader(f"**{convert_hour_to_string(min_start.hour)}!!**")
 
-        fig, ax = plt.subplots()
-        ax.plot(X.tail(24).ds, X.tail(24).y, label="Observed")
-        ax.plot(forecast.ds, forecast["LGBMRegressor"], label="Forecast")
-        ax.set_title(f"24-hour Forecast for {zones[result['zone']]['zoneName']}")
-
-        # Set major locator to every hour
-        ax.xaxis.set_major_locator(mdates.HourLocator(interval=6, tz=timezone_str))
-
-        # Set major formatter to show date and time
-        ax.xaxis.set_major_formatter(
-            mdates.DateFormatter("%Y-%m-%d %H:%M", tz=timezone_str)
+        st.vega_lite_chart(
+            get_forecast_chart(
+                result["zone"],
+                now,
+                timezone_str,
+                X.tail(24),
+                forecast,
+                zones[result["zone"]]["zoneName"],
+            ),
+            use_container_width=True,
         )
 
-        # Optional: rotate and align the tick labels so they look better
-        plt.setp(ax.get_xticklabels(), rotation=45, ha="right")
-        # Optional: add grid for better readability
-        ax.grid(True)
-        ax.legend(bbox_to_anchor=(1, 0.7))
-        ax.set_ylabel("Carbon Intensity (gCO2eq/kWh)")
-        fig.autofmt_xdate()
-        st.pyplot(fig)
+    elif view == "Personal Footprint":
+        from power_dashboard.co2_store import read_co2_intensity
+        from power_dashboard.greenbutton_stream import parse_interval_readings
 
-    with tab3:
         st.title("Personal CO2 Calculator")
 
         uploaded_file = st.file_uploader("Choose a Green Button XML file")
         if uploaded_file is not None:
-            stringio = StringIO(uploaded_file.getvalue().decode("utf-8"))
-            string_data = stringio.read()
-            usage_points = parse.parse_str(string_data)
-
-            personal_data_list = []
-            for up in usage_points:
-                for mr in up.meterReadings:
-                    for ir in mr.intervalReadings:
-                        personal_data_list.append([ir.timePeriod.start, ir.timePeriod.duration, ir.value, ir.value_symbol])
-
-            personal_df = pd.DataFrame(personal_data_list, columns=['Time Period Start', 'Time Period Duration', 'Net Usage', 'Amount Symbol'])
-            personal_df["timestamp"] = pd.to_datetime(personal_df["Time Period Start"]).dt.tz_convert(timezone_str)
-            start_date = personal_df['Time Period Start'].iloc[0].strftime("%Y-%m-%d")
-            end_date = personal_df['Time Period Start'].iloc[-1] + datetime.timedelta(days=1) 
+            # Stream the upload straight from the file object rather than decoding it into one big string
+            with span("app.parse_greenbutton"):
+                personal_df = parse_interval_readings(uploaded_file)
+            if personal_df["Amount Symbol"].nunique() > 1:
+                # e.g. electricity and gas meters in one export; only electricity (Wh) has grid CO2
+                personal_df = personal_df[
+                    personal_df["Amount Symbol"] == "Wh"
+                ].reset_index(drop=True)
+            personal_df["timestamp"] = pd.to_datetime(
+                personal_df["Time Period Start"]
+            ).dt.tz_convert(timezone_str)
+            start_date = personal_df["Time Period Start"].iloc[0].strftime("%Y-%m-%d")
+            end_date = personal_df["Time Period Start"].iloc[-1] + datetime.timedelta(
+                days=1
+            )
             end_date = end_date.strftime("%Y-%m-%d")
 
-            LOCAL_BALANCING_AUTHORITY = result["zone"].split('-')[-1]
+            LOCAL_BALANCING_AUTHORITY = result["zone"].split("-")[-1]
 
-            co2_kwh_est_sum = get_co2_data_hourly(
-                LOCAL_BALANCING_AUTHORITY, 
-                start_date, 
+            # Precomputed hourly intensity; only hours not yet in the store are derived from EIA data
+            co2_kwh_est_sum = read_co2_intensity(
+                LOCAL_BALANCING_AUTHORITY,
+                start_date,
                 end_date,
             )
 
             personal_use_by_hour_est = co2_kwh_est_sum.merge(
-                personal_df,
-                how="left",
-                on=["timestamp"]
+                personal_df, how="left", on=["timestamp"]
             )
-            personal_use_by_hour_est['Net gCO2e'] = (
-                personal_use_by_hour_est["CO2/(kWh)"] * personal_use_by_hour_est["Net Usage"] / 1000
+            personal_use_by_hour_est["Net gCO2e"] = (
+                personal_use_by_hour_est["CO2/(kWh)"]
+                * personal_use_by_hour_est["Net Usage"]
+                / 1000
             )
-            personal_use_by_hour_est = personal_use_by_hour_est[~personal_use_by_hour_est['Net gCO2e'].isnull()]
-
-            total_for_timeframe = personal_use_by_hour_est['Net gCO2e'].sum() / 1000
-            st.subheader(f"Total personal use for time frame: {total_for_timeframe:.2f} kgCO2e") 
+            personal_use_by_hour_est = personal_use_by_hour_est[
+                ~personal_use_by_hour_est["Net gCO2e"].isnull()
+            ]
 
-            fig_pf, pf = plt.subplots(figsize=(10, 3))
-            pf.plot(
-                personal_use_by_hour_est['timestamp'],
-                personal_use_by_hour_est['Net gCO2e'],
-                label="Net Carbon Produced by Hour",
+            total_for_timeframe = personal_use_by_hour_est["Net gCO2e"].sum() / 1000
+            st.subheader(
+                f"Total personal use for time frame: {total_for_timeframe:.2f} kgCO2e"
             )
 
-            pf.legend()
-            pf.set_ylabel("gCO2e")
-            pf.set_xlabel("Time")
-
-            st.pyplot(fig_pf)
-            st.caption(
-                "Carbon Produced by Hour Estimated"
+            # Downsampled to the chart width, so a year of readings costs no more to draw than a week
+            st.vega_lite_chart(
+                time_series_spec(
+                    personal_use_by_hour_est,
+                    "timestamp",
+                    "Net gCO2e",
+                    "gCO2e",
+                    title="Net Carbon Produced by Hour",
+                ),
+                use_container_width=True,
             )
+            st.caption("Carbon Produced by Hour Estimated")
 
             st.text("Here is your personalized hourly Net gCO2e generation: ")
             st.dataframe(personal_use_by_hour_est)
@@ -408,5 +521,6 @@ with st.spinner("Updating..."):
             st.text("Here's the original parsed file you uploaded: ")
             st.dataframe(personal_df)
 
-            st.text(f"We used this info for EIA data: Balancing Authority {LOCAL_BALANCING_AUTHORITY}, Start Date {start_date}, End Date {end_date}")
-            
\ No newline at end of file
+            st.text(
+                f"We used this info for EIA data: Balancing Authority {LOCAL_BALANCING_AUTHORITY}, Start Date {start_date}, End Date {end_date}"
+            )
@@ -0,0 +1,350 @@
+"""
+Rolling-origin backtests and inference benchmarks for the forecast model.
+
+Backtests replay the gridemissions history: at each origin the model sees the preceding
+``history_hours`` of every region (as ``new_df``, in the region's local time like the app's and the
+batch job's input) and forecasts the next ``horizon`` hours, which are scored against what actually
+happened.  Folds are independent, so they run in parallel processes, each of which loads the model
+once.  Sweeping ``history_hours`` shows how much history ``predict`` actually needs.
+
+The latency benchmark times ``predict`` for ``new_df`` sizes (hours of history x number of series)
+and records throughput and the peak growth of the process's resident memory (RSS, sampled by psutil,
+so LightGBM's native allocations are included).
+
+    python -m power_dashboard.backtest --n-folds 60 --history-hours 72 --history-hours 336
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable, List, Optional, Union
+
+import click
+import numpy as np
+import pandas as pd
+import psutil
+from mlforecast import MLForecast
+
+from power_dashboard.forecast_batch import (
+    FORECAST_HORIZON,
+    FORECAST_MODEL_COLUMN,
+    FORECAST_MODEL_PATH,
+    predict_local_time,
+)
+from power_dashboard.load_grid_emissions_history import (
+    PARQUET_OUTPUT_DIR,
+    read_gridemissions_ts,
+)
+from power_dashboard.logging_config import configure_logging
+
+logger = logging.getLogger(__name__)
+
+BACKTEST_HISTORY_HOURS = (14 * 24,)
+BACKTEST_STEP_HOURS = 24
+BENCHMARK_HISTORY_HOURS = (48, 168, 336, 720, 2160)
+BENCHMARK_N_SERIES = (1, 2, 8, 32)
+RSS_SAMPLE_SECONDS = 0.002
+
+# Set in each worker process by _init_worker
+_model = None
+
+
+def _init_worker(model_path: str):
+    global _model
+    _model = MLForecast.load(model_path)
+
+
+def load_history(
+    regions: Iterable[str],
+    start: Optional[pd.Timestamp] = None,
+    end: Optional[pd.Timestamp] = None,
+    path: Union[str, Path] = PARQUET_OUTPUT_DIR,
+) -> pd.DataFrame:
+    """
+    gridemissions history for ``regions`` as a (unique_id, ds, y) frame sorted by series and time.
+
+    ``ds`` is UTC; folds are localized to each region's timezone for ``predict``, as in production.
+    """
+    history = pd.concat(
+        [
+            read_gridemissions_ts(region, start=start, end=end, path=path)
+            for region in regions
+        ],
+        ignore_index=True,
+    )
+    history = history.rename(
+        columns={"region": "unique_id", "period": "ds", "co2_intensity": "y"}
+    )
+    history["unique_id"] = history["unique_id"].astype(str)
+    return history[["unique_id", "ds", "y"]].sort_values(
+        ["unique_id", "ds"], ignore_index=True
+    )
+
+
+def rolling_origins(
+    history: pd.DataFrame,
+    n_folds: int,
+    horizon: int = FORECAST_HORIZON,
+    step_hours: int = BACKTEST_STEP_HOURS,
+    min_history_hours: int = max(BACKTEST_HISTORY_HOURS),
+) -> List[pd.Timestamp]:
+    """
+    The last ``n_folds`` forecast origins, ``step_hours`` apart, each with ``horizon`` hours of actuals after it
+    """
+    last_origin = history["ds"].max() - pd.Timedelta(hours=horizon - 1)
+    first_allowed = history["ds"].min() + pd.Timedelta(hours=min_history_hours)
+    origins = [
+        last_origin - pd.Timedelta(hours=step_hours * fold) for fold in range(n_folds)
+    ]
+    return sorted(origin for origin in origins if origin >= first_allowed)
+
+
+def _run_fold(fold: dict) -> pd.DataFrame:
+    """
+    Forecast one origin for every history length; returns one row per (region, history_hours, hour ahead)
+    """
+    results = []
+    for history_hours, new_df in fold["inputs"].items():
+        forecast = predict_local_time(_model, new_df, fold["horizon"])
+        scored = forecast.merge(fold["actuals"], on=["unique_id", "ds"], how="inner")
+        scored["history_hours"] = history_hours
+        scored["origin"] = fold["origin"]
+        results.append(scored.rename(columns={FORECAST_MODEL_COLUMN: "y_hat"}))
+    return pd.concat(results, ignore_index=True)
+
+
+def backtest(
+    history: pd.DataFrame,
+    n_folds: int,
+    history_hours: Iterable[int] = BACKTEST_HISTORY_HOURS,
+    horizon: int = FORECAST_HORIZON,
+    step_hours: int = BACKTEST_STEP_HOURS,
+    model_path: str = FORECAST_MODEL_PATH,
+    max_workers: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    Forecasts and actuals for every fold, region and history length, computed on ``max_workers`` processes
+    """
+    history_hours = sorted(history_hours)
+    origins = rolling_origins(history, n_folds, horizon, step_hours, history_hours[-1])
+    # Ship each worker only the slices its fold needs
+    folds = [
+        {
+            "origin": origin,
+            "horizon": horizon,
+            "inputs": {
+                hours: history[
+                    (history["ds"] < origin)
+                    & (history["ds"] >= origin - pd.Timedelta(hours=hours))
+                ]
+                for hours in history_hours
+            },
+            "actuals": history[
+                (history["ds"] >= origin)
+                & (history["ds"] < origin + pd.Timedelta(hours=horizon))
+            ],
+        }
+        for origin in origins
+    ]
+    logger.info(
+        f"Backtesting {len(folds)} folds x {len(history_hours)} history lengths"
+    )
+    with ProcessPoolExecutor(
+        max_workers=max_workers, initializer=_init_worker, initargs=(model_path,)
+    ) as executor:
+        results = list(executor.map(_run_fold, folds))
+    if not results:
+        raise ValueError("History is too short for any fold")
+    return pd.concat(results, ignore_index=True)
+
+
+def score_backtest(results: pd.DataFrame) -> pd.DataFrame:
+    """
+    MAE, RMSE, MAPE (%) and WAPE (%) per region and history length.
+
+    MAPE skips hours whose actual intensity is 0, and hours near 0 still dominate it; WAPE (total
+    absolute error over total actual) stays meaningful for regions that get close to zero.
+    """
+    error = results["y_hat"] - results["y"]
+    scored = results.assign(
+        abs_error=error.abs(),
+        squared_error=error**2,
+        abs_pct_error=(error / results["y"].where(results["y"] != 0)).abs() * 100,
+        abs_actual=results["y"].abs(),
+    )
+    scores = scored.groupby(["unique_id", "history_hours"]).agg(
+        mae=("abs_error", "mean"),
+        rmse=("squared_error", "mean"),
+        mape=("abs_pct_error", "mean"),
+        total_abs_error=("abs_error", "sum"),
+        total_abs_actual=("abs_actual", "sum"),
+        folds=("origin", "nunique"),
+    )
+    scores["rmse"] = np.sqrt(scores["rmse"])
+    scores["wape"] = (
+        scores["total_abs_error"]
+        / scores["total_abs_actual"].where(scores["total_abs_actual"] > 0)
+        * 100
+    )
+    return scores[["mae", "rmse", "mape", "wape", "folds"]].reset_index()
+
+
+def _benchmark_input(
+    history: pd.DataFrame, history_hours: int, n_series: int
+) -> pd.DataFrame:
+    """
+    The last ``history_hours`` of each region, replicated under new ids up to ``n_series`` series
+    """
+    latest = history[
+        history["ds"] > history["ds"].max() - pd.Timedelta(hours=history_hours)
+    ]
+    regions = latest["unique_id"].unique()
+    copies = []
+    for copy in range(n_series):
+        region = regions[copy % len(regions)]
+        series = latest[latest["unique_id"] == region]
+        copies.append(
+            series.assign(
+                unique_id=region if copy < len(regions) else f"{region}_{copy}"
+            )
+        )
+    return pd.concat(copies, ignore_index=True)
+
+
+class _PeakRSS:
+    """
+    Sample the process's resident memory in a background thread to find how far it grows inside the block
+    """
+
+    def __init__(self, interval: float = RSS_SAMPLE_SECONDS):
+        self.interval = interval
+        self.process = psutil.Process()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.process.memory_info().rss)
+
+    def __enter__(self):
+        self.base = self.peak = self.process.memory_info().rss
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.process.memory_info().rss)
+        return False
+
+    @property
+    def growth_mb(self) -> float:
+        return (self.peak - self.base) / 1024**2
+
+
+def benchmark_predict(
+    model,
+    history: pd.DataFrame,
+    history_hours: Iterable[int] = BENCHMARK_HISTORY_HOURS,
+    n_series: Iterable[int] = BENCHMARK_N_SERIES,
+    horizon: int = FORECAST_HORIZON,
+    repeats: int = 5,
+) -> pd.DataFrame:
+    """
+    Median ``predict`` latency, throughput (forecast hours per second) and peak RSS growth per ``new_df`` size
+    """
+    rows = []
+    for hours in history_hours:
+        for series in n_series:
+            new_df = _benchmark_input(history, hours, series)
+            model.predict(h=horizon, new_df=new_df)  # warm up
+            timings = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                model.predict(h=horizon, new_df=new_df)
+                timings.append(time.perf_counter() - start)
+
+            with _PeakRSS() as rss:
+                model.predict(h=horizon, new_df=new_df)
+
+            latency = float(np.median(timings))
+            rows.append(
+                {
+                    "history_hours": hours,
+                    "n_series": series,
+                    "new_df_rows": len(new_df),
+                    "latency_s": latency,
+                    "throughput_hours_per_s": series * horizon / latency,
+                    "peak_rss_growth_mb": rss.growth_mb,
+                }
+            )
+            logger.info(
+                f"predict with {hours}h x {series} series: {latency * 1000:.1f} ms, +{rss.growth_mb:.1f} MB"
+            )
+    return pd.DataFrame(rows)
+
+
+@click.command()
+@click.option(
+    "--n-folds",
+    default=30,
+    show_default=True,
+    help="Number of rolling forecast origins",
+)
+@click.option(
+    "--history-hours",
+    multiple=True,
+    type=int,
+    default=BACKTEST_HISTORY_HOURS,
+    show_default=True,
+    help="Hours of history given to predict; repeat to compare truncations",
+)
+@click.option("--step-hours", default=BACKTEST_STEP_HOURS, show_default=True)
+@click.option(
+    "--max-workers",
+    default=None,
+    type=int,
+    help="Processes for backtest folds (default: all cores)",
+)
+@click.option("--model-path", default=FORECAST_MODEL_PATH, show_default=True)
+@click.option("--output-dir", default="data/processed/backtest", show_default=True)
+@click.option("--skip-latency", is_flag=True, help="Only run the accuracy backtest")
+def main(
+    n_folds,
+    history_hours,
+    step_hours,
+    max_workers,
+    model_path,
+    output_dir,
+    skip_latency,
+):
+    configure_logging("pipeline_logs/backtest.log")
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    model = MLForecast.load(model_path)
+    history = load_history(model.ts.uids)
+
+    results = backtest(
+        history,
+        n_folds,
+        history_hours,
+        step_hours=step_hours,
+        model_path=model_path,
+        max_workers=max_workers,
+    )
+    scores = score_backtest(results)
+    results.to_parquet(output_dir / "backtest_forecasts.parquet", index=False)
+    scores.to_csv(output_dir / "backtest_scores.csv", index=False)
+    logger.info(f"Backtest scores:\n{scores.to_string(index=False)}")
+
+    if not skip_latency:
+        latency = benchmark_predict(model, history)
+        latency.to_csv(output_dir / "predict_latency.csv", index=False)
+        logger.info(f"predict latency:\n{latency.to_string(index=False)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Vega-Lite specs for the dashboard charts, drawn in the browser by ``st.vega_lite_chart``.
+
+Time series longer than the chart is wide are reduced with Largest-Triangle-Three-Buckets (LTTB)
+before they are serialised.  LTTB keeps the point in each bucket that forms the largest triangle with
+its neighbours, so peaks and troughs survive where a plain stride or mean would flatten them.  The
+payload, and the work to build it, is therefore bounded by the pixel width rather than the length of
+the series.
+"""
+
+import logging
+import os
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# About one point per horizontal pixel of a wide-layout chart
+CHART_WIDTH_PX = int(os.getenv("CHART_WIDTH_PX", 1000))
+CHART_HEIGHT_PX = 300
+VEGA_LITE_SCHEMA = "https://vega.github.io/schema/vega-lite/v5.json"
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Positions of the ``n_out`` points LTTB keeps from (x, y); x must be numeric and sorted
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # First and last points are always kept; the rest are split into n_out - 2 buckets
+    edges = (np.arange(n_out - 1) * (n - 2) / (n_out - 2)).astype(int) + 1
+    edges[-1] = n - 1
+    selected = np.empty(n_out, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for bucket in range(n_out - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        # Average of the next bucket (or the last point) is the third corner of the triangle
+        next_stop = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x = x[stop:next_stop].mean()
+        next_y = y[stop:next_stop].mean()
+        area = np.abs(
+            (x[previous] - next_x) * (y[start:stop] - y[previous])
+            - (x[previous] - x[start:stop]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(area))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def downsample(
+    df: pd.DataFrame,
+    x: str,
+    y: str,
+    series: Optional[str] = None,
+    n_out: int = CHART_WIDTH_PX,
+) -> pd.DataFrame:
+    """
+    Rows of ``df`` kept by LTTB on (x, y), at most ``n_out`` per series; rows with a missing y are dropped
+    """
+    df = df.dropna(subset=[y]).sort_values([series, x] if series else x)
+    if series:
+        return pd.concat(
+            [
+                downsample(group, x, y, n_out=n_out)
+                for _, group in df.groupby(series, sort=False)
+            ]
+        )
+    if len(df) <= n_out:
+        return df
+    x_values = df[x]
+    if pd.api.types.is_datetime64_any_dtype(x_values):
+        x_values = x_values.astype("int64")
+    logger.debug(f"Downsampling {y} from {len(df)} to {n_out} points")
+    return df.iloc[lttb_indices(x_values.to_numpy(), df[y].to_numpy(), n_out)]
+
+
+def _wall_clock(times: pd.Series) -> pd.Series:
+    """
+    ISO strings of the local wall-clock time, marked as UTC so a utc scale shows them unshifted in any browser
+    """
+    if getattr(times.dt, "tz", None) is not None:
+        times = times.dt.tz_localize(None)
+    return times.dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def time_series_spec(
+    df: pd.DataFrame,
+    x: str,
+    y: str,
+    y_title: str,
+    series: Optional[str] = None,
+    title: Optional[str] = None,
+    rule: Optional[float] = None,
+    rule_title: Optional[str] = None,
+    n_out: int = CHART_WIDTH_PX,
+) -> dict:
+    """
+    Line chart of y over the (local, tz-aware) times in x, one line per ``series``, with an optional horizontal rule
+    """
+    columns = [x, y] + ([series] if series else [])
+    data = downsample(df[columns], x, y, series, n_out)
+    values = data.assign(**{x: _wall_clock(data[x])}).to_dict(orient="records")
+
+    encoding = {
+        "x": {
+            "field": x,
+            "type": "temporal",
+            "scale": {"type": "utc"},
+            "title": "Time",
+        },
+        "y": {"field": y, "type": "quantitative", "title": y_title},
+        "tooltip": [
+            {
+                "field": x,
+                "type": "temporal",
+                "scale": {"type": "utc"},
+                "format": "%Y-%m-%d %H:%M",
+                "formatType": "utc",
+            },
+            {"field": y, "type": "quantitative", "format": ".1f"},
+        ],
+    }
+    if series:
+        encoding["color"] = {"field": series, "type": "nominal", "title": None}
+    layers = [
+        {"mark": {"type": "line", "point": len(data) <= 48}, "encoding": encoding}
+    ]
+    if rule is not None:
+        layers.append(
+            {
+                "mark": {"type": "rule", "color": "red", "strokeDash": [4, 4]},
+                "encoding": {
+                    "y": {"datum": rule},
+                    "tooltip": {"value": f"{rule_title or y_title}: {rule:.1f}"},
+                },
+            }
+        )
+    return {
+        "$schema": VEGA_LITE_SCHEMA,
+        "title": title,
+        "height": CHART_HEIGHT_PX,
+        "data": {"values": values},
+        "layer": layers,
+    }
+
+
+def bar_spec(
+    counts: pd.Series, x_title: str, y_title: str, title: Optional[str] = None
+) -> dict:
+    """
+    Bar chart of ``counts`` (index -> value), keeping the index order
+    """
+    values = [{"x": str(label), "y": float(value)} for label, value in counts.items()]
+    return {
+        "$schema": VEGA_LITE_SCHEMA,
+        "title": title,
+        "height": CHART_HEIGHT_PX,
+        "data": {"values": values},
+        "mark": "bar",
+        "encoding": {
+            "x": {"field": "x", "type": "ordinal", "sort": None, "title": x_title},
+            "y": {"field": "y", "type": "quantitative", "title": y_title},
+            "tooltip": [
+                {"field": "x", "title": x_title},
+                {"field": "y", "title": y_title},
+            ],
+        },
+    }
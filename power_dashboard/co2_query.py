@@ -0,0 +1,305 @@
+"""
+Out-of-core CO2 intensity for many BAs and years, computed by DuckDB over the EIA Parquet cache.
+
+``eia_api.get_co2_data_hourly`` works on one BA at a time and materializes every intermediate
+frame in pandas.  This module expresses the same joins and aggregations as one SQL query over the
+cached EIA responses (``EIA_CACHE_DIR/<url_segment>/*.parquet``) for every BA at once.  DuckDB pushes
+the period and BA filters into the Parquet scans, runs the query on all cores, and spills to
+``CO2_QUERY_TEMP_DIR`` rather than exceeding ``CO2_QUERY_MEMORY_LIMIT``.  Writing the result
+straight to Parquet (``output_path``) keeps even all-BA, multi-year results out of Python memory.
+
+The result matches ``get_co2_data_hourly`` for each BA (see ``parity_check``), provided the cache
+holds the same demand, interchange and grid mix hours the pandas path would fetch.  Fill the cache
+first, e.g. with ``co2_store`` or the pandas path itself.
+
+DuckDB is optional: ``pip install duckdb`` to use this module.
+
+    python -m power_dashboard.co2_query --start 2023-01-01 --end 2024-12-31 --output data/processed/co2_all_bas.parquet
+"""
+
+import logging
+import os
+from pathlib import Path
+from typing import Iterable, Optional, Union
+
+import click
+import pandas as pd
+
+from power_dashboard.eia_cache import EIA_CACHE_DIR
+from power_dashboard.emission_factors import (
+    DEFAULT_FACTOR_SET,
+    FACTOR_COLUMNS,
+    get_factor_set,
+)
+from power_dashboard.instrumentation import span
+from power_dashboard.logging_config import configure_logging
+
+logger = logging.getLogger(__name__)
+
+CO2_QUERY_MEMORY_LIMIT = os.getenv("CO2_QUERY_MEMORY_LIMIT", "4GB")
+CO2_QUERY_TEMP_DIR = Path(os.getenv("CO2_QUERY_TEMP_DIR", "data/interim/duckdb_tmp"))
+CO2_QUERY_THREADS = int(os.getenv("CO2_QUERY_THREADS", os.cpu_count() or 1))
+
+# Output column for each factor column, as named by get_co2_data_hourly(bands=True)
+BAND_COLUMNS = {
+    "central": "CO2/(kWh)",
+    "low": "CO2/(kWh) low",
+    "high": "CO2/(kWh) high",
+}
+
+# Cached series for overlapping facet sets hold copies of the same rows, so rows are first made
+# unique per key, keeping the copy from the most recently written file (the latest EIA revision).
+CO2_QUERY = """
+WITH
+demand AS (
+    SELECT period, respondent AS ba, "type-name" AS type_name, arg_max("Demand (MWh)", modified) AS value
+    FROM read_parquet($region_data, filename = true) JOIN cache_files USING (filename)
+    WHERE period BETWEEN $start AND $end {ba_filter_respondent}
+    GROUP BY period, respondent, type, "type-name"
+),
+-- Energy generated and used locally: min(Demand, Net generation), 0 if either is missing
+local_use AS (
+    SELECT
+        period,
+        ba,
+        CASE
+            WHEN count(*) FILTER (type_name = 'Demand') = 0 OR count(*) FILTER (type_name = 'Net generation') = 0
+            THEN 0
+            ELSE least(
+                coalesce(sum(value) FILTER (type_name = 'Demand'), 0),
+                coalesce(sum(value) FILTER (type_name = 'Net generation'), 0)
+            )
+        END AS energy
+    FROM demand
+    GROUP BY period, ba
+),
+interchange AS (
+    SELECT period, toba, fromba, arg_max("Interchange to local BA (MWh)", modified) AS value
+    FROM read_parquet($interchange_data, filename = true) JOIN cache_files USING (filename)
+    WHERE period BETWEEN $start AND $end {ba_filter_toba}
+    GROUP BY period, toba, fromba
+),
+-- Only energy flowing in to the local BA counts, so net exports are clipped to 0
+consumption AS (
+    SELECT period, toba AS ba, fromba AS source, greatest(coalesce(sum(value), 0), 0) AS energy
+    FROM interchange
+    GROUP BY period, toba, fromba
+    UNION ALL
+    SELECT period, ba, ba AS source, energy FROM local_use
+),
+generation AS (
+    SELECT period, respondent, fueltype, arg_max("Generation (MWh)", modified) AS generation
+    FROM read_parquet($fuel_type_data, filename = true) JOIN cache_files USING (filename)
+    WHERE period BETWEEN $start AND $end AND respondent IN (SELECT DISTINCT source FROM consumption)
+    GROUP BY period, respondent, fueltype
+),
+generation_total AS (
+    SELECT period, respondent, sum(generation) AS total
+    FROM generation
+    GROUP BY period, respondent
+),
+-- Share of each (source BA, fuel type) in the energy consumed at the local BA
+contributions AS (
+    SELECT
+        consumption.ba,
+        generation.period,
+        generation.fueltype,
+        (generation.generation / generation_total.total) * (consumption.energy / generation_total.total) AS share
+    FROM generation
+    JOIN generation_total USING (period, respondent)
+    JOIN consumption ON consumption.period = generation.period AND consumption.source = generation.respondent
+    WHERE generation_total.total > 0
+)
+SELECT
+    contributions.ba,
+    contributions.period AS timestamp,
+    {co2_columns}
+FROM contributions
+LEFT JOIN factors ON factors.fueltype = contributions.fueltype
+GROUP BY contributions.ba, contributions.period
+ORDER BY contributions.ba, contributions.period
+"""
+
+
+def _connect(memory_limit: str, threads: int, temp_dir: Union[str, Path]):
+    try:
+        import duckdb
+    except ImportError:
+        raise ImportError(
+            "power_dashboard.co2_query needs duckdb: pip install duckdb"
+        ) from None
+
+    Path(temp_dir).mkdir(parents=True, exist_ok=True)
+    connection = duckdb.connect()
+    connection.execute("SET TimeZone = 'UTC'")
+    connection.execute(f"SET memory_limit = '{memory_limit}'")
+    connection.execute(f"SET threads = {int(threads)}")
+    connection.execute(f"SET temp_directory = '{temp_dir}'")
+    # Row order within groups doesn't matter here, and dropping it lets large aggregations spill
+    connection.execute("SET preserve_insertion_order = false")
+    return connection
+
+
+def _utc(value: Union[str, pd.Timestamp]) -> pd.Timestamp:
+    timestamp = pd.Timestamp(value)
+    return (
+        timestamp.tz_localize("UTC")
+        if timestamp.tzinfo is None
+        else timestamp.tz_convert("UTC")
+    )
+
+
+def _cache_files(cache_dir: Path, url_segment: str) -> pd.DataFrame:
+    """
+    The cached Parquet files of one EIA series and when each was last written
+    """
+    directory = cache_dir / url_segment
+    paths = sorted(directory.glob("*.parquet"))
+    if not paths:
+        raise FileNotFoundError(f"No cached {url_segment} Parquet files in {directory}")
+    return pd.DataFrame(
+        {
+            "filename": [str(path) for path in paths],
+            "modified": [path.stat().st_mtime for path in paths],
+        }
+    )
+
+
+@span("co2_query.query")
+def query_co2_intensity(
+    bas: Optional[Iterable[str]] = None,
+    start: Optional[Union[str, pd.Timestamp]] = None,
+    end: Optional[Union[str, pd.Timestamp]] = None,
+    factor_set: Union[str, pd.DataFrame] = DEFAULT_FACTOR_SET,
+    bands: bool = False,
+    output_path: Optional[Union[str, Path]] = None,
+    cache_dir: Union[str, Path] = EIA_CACHE_DIR,
+    memory_limit: str = CO2_QUERY_MEMORY_LIMIT,
+    threads: int = CO2_QUERY_THREADS,
+    temp_dir: Union[str, Path] = CO2_QUERY_TEMP_DIR,
+) -> Optional[pd.DataFrame]:
+    """
+    Hourly CO2 per kWh consumed in each of ``bas`` (default: every BA in the cache) from start to end.
+
+    Returns a frame of ``ba``, ``timestamp`` and the get_co2_data_hourly columns, or with
+    ``output_path`` writes it there as Parquet and returns None.
+    """
+    cache_dir = Path(cache_dir)
+    bas = sorted(set(bas)) if bas is not None else None
+    factor_columns = FACTOR_COLUMNS if bands else ["central"]
+    co2_columns = ",\n    ".join(
+        f'coalesce(sum(contributions.share * coalesce(factors.{column}, 0)), 0) AS "{BAND_COLUMNS[column]}"'
+        for column in ["central", "low", "high"]
+        if column in factor_columns
+    )
+    query = CO2_QUERY.format(
+        ba_filter_respondent="AND respondent IN (SELECT ba FROM bas)"
+        if bas is not None
+        else "",
+        ba_filter_toba="AND toba IN (SELECT ba FROM bas)" if bas is not None else "",
+        co2_columns=co2_columns,
+    )
+    cache_files = {
+        url_segment: _cache_files(cache_dir, url_segment)
+        for url_segment in ["region-data", "interchange-data", "fuel-type-data"]
+    }
+    parameters = {
+        "region_data": cache_files["region-data"]["filename"].tolist(),
+        "interchange_data": cache_files["interchange-data"]["filename"].tolist(),
+        "fuel_type_data": cache_files["fuel-type-data"]["filename"].tolist(),
+        "start": _utc(start if start is not None else pd.Timestamp.min.ceil("D")),
+        "end": _utc(end if end is not None else pd.Timestamp.max.floor("D")),
+    }
+
+    connection = _connect(memory_limit, threads, temp_dir)
+    try:
+        connection.register(
+            "cache_files", pd.concat(cache_files.values(), ignore_index=True)
+        )
+        connection.register(
+            "factors", get_factor_set(factor_set).rename_axis("fueltype").reset_index()
+        )
+        if bas is not None:
+            connection.register("bas", pd.DataFrame({"ba": bas}))
+        if output_path is not None:
+            output_path = Path(output_path)
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            connection.execute(
+                f"COPY ({query}) TO '{output_path}' (FORMAT parquet, COMPRESSION zstd)",
+                parameters,
+            )
+            logger.info(f"Wrote CO2 intensity to {output_path}")
+            return None
+        return connection.execute(query, parameters).df()
+    finally:
+        connection.close()
+
+
+def parity_check(
+    ba: str,
+    start_date: str,
+    end_date: str,
+    factor_set: str = DEFAULT_FACTOR_SET,
+    bands: bool = False,
+    cache_dir: Union[str, Path] = EIA_CACHE_DIR,
+    rtol: float = 1e-9,
+) -> pd.DataFrame:
+    """
+    Compare query_co2_intensity with get_co2_data_hourly for one BA; raises AssertionError on a mismatch.
+
+    Run it after the pandas path has filled the cache for the range, so both read the same hours.
+    """
+    from power_dashboard.eia_api import get_co2_data_hourly
+
+    expected = get_co2_data_hourly(
+        ba, start_date=start_date, end_date=end_date, factor_set=factor_set, bands=bands
+    )
+    actual = query_co2_intensity(
+        [ba],
+        start_date,
+        end_date,
+        factor_set=factor_set,
+        bands=bands,
+        cache_dir=cache_dir,
+    ).drop(columns="ba")
+    expected["timestamp"] = pd.to_datetime(expected["timestamp"], utc=True).dt.as_unit(
+        "us"
+    )
+    actual["timestamp"] = pd.to_datetime(actual["timestamp"], utc=True).dt.as_unit("us")
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False, rtol=rtol)
+    logger.info(
+        f"query_co2_intensity matches get_co2_data_hourly for {ba}: {len(actual)} hours"
+    )
+    return actual
+
+
+@click.command()
+@click.option(
+    "--ba",
+    "bas",
+    multiple=True,
+    help="Balancing authority to include; repeat for more (default: all)",
+)
+@click.option("--start", default=None, help="First hour (UTC), e.g. 2023-01-01")
+@click.option("--end", default=None, help="Last hour (UTC), e.g. 2024-12-31T23")
+@click.option("--factor-set", default=DEFAULT_FACTOR_SET, show_default=True)
+@click.option("--bands", is_flag=True, help="Include low/high emission factor bands")
+@click.option("--output", "output_path", required=True, help="Parquet file to write")
+@click.option("--memory-limit", default=CO2_QUERY_MEMORY_LIMIT, show_default=True)
+@click.option("--threads", default=CO2_QUERY_THREADS, show_default=True)
+def main(bas, start, end, factor_set, bands, output_path, memory_limit, threads):
+    configure_logging("pipeline_logs/co2_query.log")
+    query_co2_intensity(
+        bas or None,
+        start,
+        end,
+        factor_set=factor_set,
+        bands=bands,
+        output_path=output_path,
+        memory_limit=memory_limit,
+        threads=threads,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""
+Materialized hourly CO2 intensity per balancing authority.
+
+``eia_api.get_co2_data_hourly`` derives CO2/kWh from raw EIA demand, interchange and grid mix data
+for whatever range it is given.  This store keeps its output per BA (and emission factor set) in
+Parquet, with a watermark file per BA recording the last hour stored and the hour ranges
+materialized so far.  Each refresh only derives the hours after the watermark plus a trailing
+``revision_hours`` window, because EIA revises recent hours; earlier hours are kept as they are.
+Requests for hours outside the materialized ranges derive just those hours.  Footprint requests
+then read precomputed intensity for any range.
+
+Refresh every BA the app serves hourly, e.g. from cron::
+
+    python -m power_dashboard.co2_store --ba PSCO --ba ERCO
+"""
+
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+import click
+import pandas as pd
+
+from power_dashboard.eia_cache import (
+    EIA_REVISION_HOURS,
+    _from_hour,
+    _merge_intervals,
+    _subtract_intervals,
+    _to_hour,
+)
+from power_dashboard.eia_schema import EIA_VALUE_DTYPE
+from power_dashboard.emission_factors import DEFAULT_FACTOR_SET
+from power_dashboard.logging_config import configure_logging
+
+logger = logging.getLogger(__name__)
+
+CO2_STORE_DIR = Path(os.getenv("CO2_STORE_DIR", "data/processed/co2_store"))
+CO2_REVISION_HOURS = EIA_REVISION_HOURS
+# A read refreshes the store only if the BA hasn't been refreshed for this long
+CO2_REFRESH_SECONDS = 15 * 60
+# How far back the first refresh of a BA goes when no range is requested
+CO2_INITIAL_HISTORY = pd.Timedelta(days=365)
+
+HOUR_FORMAT = "%Y-%m-%dT%H"
+CO2_COLUMNS = ["CO2/(kWh)", "CO2/(kWh) low", "CO2/(kWh) high"]
+
+# Serializes refreshes within a process.  Across processes (the co2-store job and the app) each BA has
+# its own watermark file, and both it and the Parquet file are replaced atomically, so a concurrent
+# refresh of the same BA at worst derives the same hours twice.
+_lock = threading.Lock()
+
+
+def _hour(value: Union[str, datetime.date, pd.Timestamp]) -> pd.Timestamp:
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.tz_localize("UTC")
+    return timestamp.tz_convert("UTC").floor("h")
+
+
+def _store_path(ba: str, factor_set: str, store_dir: Path) -> Path:
+    return store_dir / factor_set / f"{ba}.parquet"
+
+
+def _watermark_path(ba: str, factor_set: str, store_dir: Path) -> Path:
+    return store_dir / factor_set / f"{ba}.watermark.json"
+
+
+def _rebuild_watermark(path: Path) -> Optional[dict]:
+    """
+    A watermark covering the hours stored in ``path``, for stores whose watermark file is missing
+    """
+    timestamps = pd.read_parquet(path, columns=["timestamp"])["timestamp"]
+    if timestamps.empty:
+        return None
+    first, last = timestamps.min(), timestamps.max()
+    logger.warning(
+        f"No watermark for {path}; rebuilt it from stored hours {first:{HOUR_FORMAT}}..{last:{HOUR_FORMAT}}"
+    )
+    return {
+        "first": first.strftime(HOUR_FORMAT),
+        "last": last.strftime(HOUR_FORMAT),
+        "covered": [[first.strftime(HOUR_FORMAT), last.strftime(HOUR_FORMAT)]],
+        "refreshed_at": path.stat().st_mtime,
+        "rows": len(timestamps),
+    }
+
+
+def _write_watermark(watermark: dict, ba: str, factor_set: str, store_dir: Path):
+    path = _watermark_path(ba, factor_set, store_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(watermark, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def get_watermark(
+    ba: str,
+    factor_set: str = DEFAULT_FACTOR_SET,
+    store_dir: Union[str, Path] = CO2_STORE_DIR,
+) -> Optional[dict]:
+    """
+    First and last stored hour, the hour ranges materialized so far and the last refresh time (epoch
+    seconds) for a BA, or None if nothing is stored
+    """
+    store_dir = Path(store_dir)
+    try:
+        with open(_watermark_path(ba, factor_set, store_dir)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        pass
+    path = _store_path(ba, factor_set, store_dir)
+    return _rebuild_watermark(path) if path.exists() else None
+
+
+def _covered_hours(watermark: Optional[dict]) -> list:
+    """
+    The watermark's materialized ranges as inclusive [start, end] hours since the epoch
+    """
+    if watermark is None:
+        return []
+    return [[_to_hour(start), _to_hour(end)] for start, end in watermark["covered"]]
+
+
+def _missing_hours(
+    watermark: Optional[dict], start: pd.Timestamp, end: pd.Timestamp
+) -> list:
+    """
+    Inclusive [start, end] hour ranges in start..end that have never been materialized
+    """
+    return _subtract_intervals(
+        [[_to_hour(start), _to_hour(end)]], _covered_hours(watermark)
+    )
+
+
+def _derive(
+    ba: str, start: pd.Timestamp, end: pd.Timestamp, factor_set: str, value_dtype: str
+) -> pd.DataFrame:
+    # Imported here so reading the store doesn't need the EIA client (or its Streamlit secrets)
+    from power_dashboard.eia_api import get_co2_data_hourly
+
+    logger.info(
+        f"Deriving CO2 intensity for {ba} {start:{HOUR_FORMAT}}..{end:{HOUR_FORMAT}}"
+    )
+    derived = get_co2_data_hourly(
+        ba,
+        start_date=start.strftime(HOUR_FORMAT),
+        end_date=end.strftime(HOUR_FORMAT),
+        factor_set=factor_set,
+        bands=True,
+        value_dtype=value_dtype,
+    )
+    derived["timestamp"] = pd.to_datetime(derived["timestamp"], utc=True)
+    return derived[(derived["timestamp"] >= start) & (derived["timestamp"] <= end)]
+
+
+def materialize(
+    ba: str,
+    start: Optional[Union[str, pd.Timestamp]] = None,
+    end: Optional[Union[str, pd.Timestamp]] = None,
+    factor_set: str = DEFAULT_FACTOR_SET,
+    revision_hours: int = CO2_REVISION_HOURS,
+    store_dir: Union[str, Path] = CO2_STORE_DIR,
+    value_dtype: str = EIA_VALUE_DTYPE,
+    revise: bool = True,
+) -> Tuple[pd.Timestamp, pd.Timestamp]:
+    """
+    Make sure a BA's stored intensity covers ``start`` to ``end`` (default now), deriving only new hours.
+
+    Hours in the range that were never materialized are derived, and so are the ``revision_hours``
+    before the last stored hour (and any after it) if the range reaches them and ``revise`` is set.
+    Without ``start`` only those recent hours are refreshed (or, for a new BA, CO2_INITIAL_HISTORY).
+    Returns the first and last stored hour.
+    """
+    store_dir = Path(store_dir)
+    end = _hour(end if end is not None else pd.Timestamp.now(tz="UTC"))
+    key = f"{factor_set}/{ba}"
+    path = _store_path(ba, factor_set, store_dir)
+
+    with _lock:
+        watermark = get_watermark(ba, factor_set, store_dir)
+        stored = (
+            pd.read_parquet(path) if watermark is not None and path.exists() else None
+        )
+        if stored is None:
+            watermark = None
+            start = _hour(start) if start is not None else end - CO2_INITIAL_HISTORY
+            ranges = _missing_hours(None, start, end)
+        else:
+            revision_start = _hour(watermark["last"]) - pd.Timedelta(
+                hours=revision_hours
+            )
+            start = _hour(start) if start is not None else min(revision_start, end)
+            ranges = _missing_hours(watermark, start, end)
+            if revise and max(start, revision_start) <= end:
+                ranges = _merge_intervals(
+                    ranges + [[_to_hour(max(start, revision_start)), _to_hour(end)]]
+                )
+        ranges = [
+            (_hour(_from_hour(range_start)), _hour(_from_hour(range_end)))
+            for range_start, range_end in ranges
+        ]
+
+        derived = [
+            _derive(ba, range_start, range_end, factor_set, value_dtype)
+            for range_start, range_end in ranges
+        ]
+        if stored is not None:
+            # Replace everything in a re-derived range, so hours EIA has since dropped don't linger
+            for range_start, range_end in ranges:
+                stored = stored[
+                    (stored["timestamp"] < range_start)
+                    | (stored["timestamp"] > range_end)
+                ]
+            derived.insert(0, stored)
+        combined = pd.concat(derived, ignore_index=True).sort_values(
+            "timestamp", ignore_index=True
+        )
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        combined.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+        # Hours EIA had no data for yet still count as covered; reads past the last stored hour
+        # refresh once CO2_REFRESH_SECONDS have passed, and each refresh re-derives from there.
+        covered = _merge_intervals(
+            _covered_hours(watermark) + [[_to_hour(start), _to_hour(end)]]
+        )
+        first = combined["timestamp"].min() if len(combined) else start
+        last = combined["timestamp"].max() if len(combined) else start
+        _write_watermark(
+            {
+                "first": first.strftime(HOUR_FORMAT),
+                "last": last.strftime(HOUR_FORMAT),
+                "covered": [
+                    [_from_hour(range_start), _from_hour(range_end)]
+                    for range_start, range_end in covered
+                ],
+                "refreshed_at": time.time(),
+                "rows": len(combined),
+            },
+            ba,
+            factor_set,
+            store_dir,
+        )
+    new_hours = len(combined) - (0 if stored is None else len(stored))
+    logger.info(
+        f"{key}: derived {new_hours} hours, stored {first:{HOUR_FORMAT}}..{last:{HOUR_FORMAT}}"
+    )
+    return first, last
+
+
+def read_co2_intensity(
+    ba: str,
+    start_date: Union[str, pd.Timestamp],
+    end_date: Union[str, pd.Timestamp],
+    factor_set: str = DEFAULT_FACTOR_SET,
+    bands: bool = False,
+    refresh: bool = True,
+    store_dir: Union[str, Path] = CO2_STORE_DIR,
+) -> pd.DataFrame:
+    """
+    Stored CO2 per kWh for ``ba`` between start_date and end_date, in the format of get_co2_data_hourly.
+
+    With ``refresh`` the hours of the range that were never materialized are derived first (and only
+    those: bringing the BA up to date is the hourly co2-store job's work).  If the range runs past the
+    last stored hour, the materialized hours of the BA's revision window are re-derived too, at most
+    once per CO2_REFRESH_SECONDS.
+    """
+    store_dir = Path(store_dir)
+    start, end = _hour(start_date), _hour(end_date)
+    if refresh:
+        watermark = get_watermark(ba, factor_set, store_dir)
+        revise = (
+            watermark is not None
+            and end > _hour(watermark["last"])
+            and time.time() - watermark["refreshed_at"] > CO2_REFRESH_SECONDS
+        )
+        if watermark is None or revise or _missing_hours(watermark, start, end):
+            materialize(
+                ba,
+                start=start,
+                end=end,
+                factor_set=factor_set,
+                store_dir=store_dir,
+                revise=revise,
+            )
+
+    path = _store_path(ba, factor_set, store_dir)
+    columns = ["timestamp"] + (CO2_COLUMNS if bands else CO2_COLUMNS[:1])
+    if not path.exists():
+        return pd.DataFrame(columns=columns)
+    return pd.read_parquet(
+        path,
+        columns=columns,
+        filters=[("timestamp", ">=", start), ("timestamp", "<=", end)],
+    ).reset_index(drop=True)
+
+
+@click.command()
+@click.option(
+    "--ba",
+    "bas",
+    multiple=True,
+    required=True,
+    help="Balancing authority to refresh; repeat for more",
+)
+@click.option(
+    "--start", default=None, help="Backfill from this date if the store starts later"
+)
+@click.option("--factor-set", default=DEFAULT_FACTOR_SET, show_default=True)
+@click.option("--revision-hours", default=CO2_REVISION_HOURS, show_default=True)
+@click.option("--store-dir", default=CO2_STORE_DIR, show_default=True)
+def main(bas, start, factor_set, revision_hours, store_dir):
+    configure_logging("pipeline_logs/co2_store.log")
+    for ba in bas:
+        materialize(
+            ba,
+            start=start,
+            factor_set=factor_set,
+            revision_hours=revision_hours,
+            store_dir=store_dir,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,300 +1,421 @@
-import logging
-import os
 import datetime
 import json
-import requests
-from typing import Optional
-import streamlit as st
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
 # 3rd party packages
-from IPython import display
 import pandas as pd
+import requests
+import streamlit as st
 
-logger = logging.getLogger(__name__)
+from power_dashboard import http_client
+from power_dashboard.eia_cache import get_default_cache
+from power_dashboard.eia_schema import EIA_VALUE_DTYPE, apply_eia_schema
+from power_dashboard.emission_factors import (
+    DEFAULT_FACTOR_SET,
+    apply_emission_factors,
+    get_factor_set,
+)
+from power_dashboard.flow_tracing import consumption_carbon_intensity
+from power_dashboard.instrumentation import propagate, set_attribute, span
 
-EIA_API_KEY = st.secrets["eia"]["api_key"];
+logger = logging.getLogger(__name__)
 
-assert EIA_API_KEY != "", "You must set an EIA API key before continuing."
+EIA_BASE_URL = os.getenv("EIA_BASE_URL", "https://api.eia.gov/v2/electricity/rto/")
+EIA_MAX_ROW_COUNT = 5000  # This is the maximum allowed per API call from the EIA
+EIA_MAX_WORKERS = 4  # Concurrent page requests per get_eia_timeseries call
 
 default_end_date = datetime.date.today().isoformat()
 default_start_date = (datetime.date.today() - datetime.timedelta(days=365)).isoformat()
 
+
+def get_eia_api_key():
+    """
+    The EIA API key, read when the first request is made so the module can be imported without secrets
+    """
+    api_key = os.getenv("EIA_API_KEY") or st.secrets["eia"]["api_key"]
+    assert api_key != "", "You must set an EIA API key before continuing."
+    return api_key
+
+
+@span("eia.co2_data_hourly")
 def get_co2_data_hourly(
     local_ba,
     start_date=default_start_date,
     end_date=default_end_date,
+    factor_set=DEFAULT_FACTOR_SET,
+    bands=False,
+    value_dtype=EIA_VALUE_DTYPE,
 ):
-    
-    demand_df = get_eia_net_demand_and_generation_timeseries_hourly([local_ba]
-        , start_date=start_date
-        , end_date=end_date
-        , frequency="hourly"
+    """
+    Estimate CO2 per kWh consumed in local_ba for every hour between start_date and end_date.
+
+    factor_set selects the emission factors (see power_dashboard.emission_factors).  With bands=True
+    the result also carries "CO2/(kWh) low" and "CO2/(kWh) high" columns.  value_dtype="float32"
+    halves the memory used by the EIA frames.
+    """
+    demand_df = get_eia_net_demand_and_generation_timeseries_hourly(
+        [local_ba],
+        start_date=start_date,
+        end_date=end_date,
+        frequency="hourly",
+        value_dtype=value_dtype,
     )
-    energy_generated_and_used_locally = demand_df.groupby("period").apply(
-       get_energy_generated_and_consumed_locally
+    energy_generated_and_used_locally = get_energy_generated_and_consumed_locally(
+        demand_df
     )
-    interchange_df = get_eia_interchange_timeseries_hourly([local_ba]
-        , start_date=start_date
-        , end_date=end_date
-        , frequency="hourly"
+    del demand_df
+    interchange_df = get_eia_interchange_timeseries_hourly(
+        [local_ba],
+        start_date=start_date,
+        end_date=end_date,
+        frequency="hourly",
+        value_dtype=value_dtype,
     )
     energy_imported_then_consumed_locally_by_source_ba = (
-        interchange_df.groupby(["period", "fromba"])[
+        interchange_df.groupby(["period", "fromba"], observed=True)[
             "Interchange to local BA (MWh)"
-        ].sum()
+        ]
+        .sum()
         ## We're only interested in data points where energy is coming *in* to the local BA, i.e. where net export is negative
         ## Therefore, ignore positive net exports
-        .apply(lambda interchange: max(interchange, 0))
+        .clip(lower=0)
     )
-    consumed_locally_column_name = "Power consumed locally (MWh)"
+    del interchange_df
 
-    # Combine these two together to get all energy used locally, grouped by the source BA (both local and connected)
+    # Combine these two together to get all energy used locally, indexed by (period, source BA) where the
+    # source BA is either the local BA or one it imports from
+    energy_generated_and_used_locally.index = pd.MultiIndex.from_arrays(
+        [
+            energy_generated_and_used_locally.index,
+            pd.Index([local_ba] * len(energy_generated_and_used_locally)),
+        ],
+        names=["period", "fromba"],
+    )
     energy_consumed_locally_by_source_ba = pd.concat(
         [
-            energy_imported_then_consumed_locally_by_source_ba.rename(
-                consumed_locally_column_name
-            ).reset_index("fromba"),
-            pd.DataFrame(
-                {
-                    "fromba": local_ba,
-                    consumed_locally_column_name: energy_generated_and_used_locally,
-                }
-            ),
+            energy_imported_then_consumed_locally_by_source_ba,
+            energy_generated_and_used_locally,
         ]
-    ).reset_index()
+    )
 
     # Now that we know how much (if any) energy is imported by our local BA, and from which source BAs,
     # let's get a full breakdown of the grid mix (fuel types) for that imported energy
 
     # First, get a list of all source BAs: our local BA plus the ones we're importing from
-    all_source_bas = energy_consumed_locally_by_source_ba["fromba"].unique().tolist()
+    all_source_bas = (
+        energy_consumed_locally_by_source_ba.index.unique("fromba").astype(str).tolist()
+    )
 
     # Then, fetch the fuel type breakdowns for each of those BAs
-    generation_types_by_ba = get_eia_grid_mix_timeseries_hourly(all_source_bas
-        , start_date=start_date
-        , end_date=end_date
-        , frequency="hourly"
-        ).rename(
-        {"respondent": "fromba", "type-name": "generation_type"}, axis="columns"
+    generation_types_by_ba = get_eia_grid_mix_timeseries_hourly(
+        all_source_bas,
+        start_date=start_date,
+        end_date=end_date,
+        frequency="hourly",
+        value_dtype=value_dtype,
     )
-    # The goal is to get a DataFrame of energy used at the local BA (in MWh), broken down by both
-    #  * the BA that the energy came from, and 
+    # The goal is to get the energy used at the local BA (in MWh), broken down by both
+    #  * the BA that the energy came from, and
     #  * the fuel type of that energy.
-    # So we'll end up with one row for each combination of source BA and fuel type.
+    # So we'll end up with one value for each combination of source BA and fuel type.
 
     # To get there, we need to combine the amount of imported energy from each source ba with grid mix for that source BA.
     # The general formula is:
-    # Power consumed locally from a (BA, fuel type) combination = 
+    # Power consumed locally from a (BA, fuel type) combination =
     #    total power consumed locally from this source BA * (fuel type as a % of source BA's generation)
-    # fuel type as a % of source BA's generation = 
+    # fuel type as a % of source BA's generation =
     #    (total generation at source BA) / (total generation for this fuel type at this BA)
-    total_generation_by_source_ba = generation_types_by_ba.groupby(["period", "fromba"])[
-        "Generation (MWh)"
-    ].sum()
-    generation_types_by_ba_with_totals = generation_types_by_ba.join(
-        total_generation_by_source_ba,
-        how="left",
-        on=["period", "fromba"],
-        rsuffix=" Total",
-    )
-    generation_types_by_ba_with_totals["Generation (% of BA generation)"] = (
-        generation_types_by_ba_with_totals["Generation (MWh)"]
-        / generation_types_by_ba_with_totals["Generation (MWh) Total"]
+    # Everything below works on column arrays aligned with generation_types_by_ba, so the (large) grid mix
+    # frame is never joined, merged or copied.
+    generation = generation_types_by_ba["Generation (MWh)"]
+    generation_total = generation_types_by_ba.groupby(
+        ["period", "respondent"], observed=True
+    )["Generation (MWh)"].transform("sum")
+    consumed_locally_from_source_ba = energy_consumed_locally_by_source_ba.reindex(
+        pd.MultiIndex.from_arrays(
+            [
+                generation_types_by_ba["period"],
+                generation_types_by_ba["respondent"].astype(str),
+            ]
+        )
+    ).to_numpy()
+    # Only hours where the source BA generated something and we have consumption data for it contribute
+    has_contribution = (generation_total > 0).to_numpy() & ~pd.isna(
+        consumed_locally_from_source_ba
     )
-    generation_types_by_ba_with_totals_and_source_ba_breakdown = generation_types_by_ba_with_totals.merge(
-        energy_consumed_locally_by_source_ba.rename(
-            {"Power consumed locally (MWh)": "Power consumed locally from source BA (MWh)"},
-            axis="columns",
-        ),
-        on=["period", "fromba"],
+
+    # Share of this (source BA, fuel type) in the locally consumed energy; one vectorized factor lookup per row
+    generation_total = generation_total.to_numpy()[has_contribution]
+    local_share = (generation.to_numpy()[has_contribution] / generation_total) * (
+        consumed_locally_from_source_ba[has_contribution] / generation_total
     )
-    generation_types_by_ba_with_totals_and_source_ba_breakdown = generation_types_by_ba_with_totals_and_source_ba_breakdown.loc[generation_types_by_ba_with_totals_and_source_ba_breakdown['Generation (MWh) Total'] > 0]
-    #full_df_reindexed = (
-    #    generation_types_by_ba_with_totals_and_source_ba_breakdown.set_index(
-    #        ["period", "fromba", "generation_type"]
-    #    )
-    #)
-    co2_kwh_est = generation_types_by_ba_with_totals_and_source_ba_breakdown
-    co2_kwh_est['CO2/(kWh)'] = co2_kwh_est[['fueltype', 'Generation (% of BA generation)', "Power consumed locally from source BA (MWh)", "Generation (MWh) Total"]].apply(co2_contrib, axis=1);
+    fueltype = generation_types_by_ba["fueltype"][has_contribution]
+    if bands:
+        co2_kwh_est = apply_emission_factors(
+            fueltype, local_share, factor_set, bands=True
+        ).rename(
+            columns={
+                "central": "CO2/(kWh)",
+                "low": "CO2/(kWh) low",
+                "high": "CO2/(kWh) high",
+            }
+        )[["CO2/(kWh)", "CO2/(kWh) low", "CO2/(kWh) high"]]
+    else:
+        co2_kwh_est = apply_emission_factors(
+            fueltype, local_share, factor_set, name="CO2/(kWh)"
+        ).to_frame()
     co2_kwh_est_sum = (
-        co2_kwh_est.groupby(["timestamp"])[
-            "CO2/(kWh)"
-        ].sum()
-    ).reset_index()
-    #st.text(co2_kwh_est_sum.dtypes)
-    co2_kwh_est_sum["timestamp"] = co2_kwh_est_sum["timestamp"].apply(
-        pd.to_datetime, format="%Y/%m/%d %H:%M:%S", utc=True
+        co2_kwh_est.groupby(
+            generation_types_by_ba["period"][has_contribution].rename("timestamp")
+        )
+        .sum()
+        .reset_index()
     )
-    #st.text(co2_kwh_est_sum.dtypes)
 
     return co2_kwh_est_sum
 
-# https://github.com/jdechalendar/gridemissions/blob/696838bc82c74aa40ab54206b36aec2026908a2d/src/gridemissions/emissions.py#L14-L33 
+
+@span("eia.consumption_co2_data_hourly")
+def get_consumption_co2_data_hourly(
+    balancing_authorities,
+    start_date=default_start_date,
+    end_date=default_end_date,
+    factor_set=DEFAULT_FACTOR_SET,
+    bands=False,
+    value_dtype=EIA_VALUE_DTYPE,
+):
+    """
+    Consumption-based CO2 per kWh for every BA in balancing_authorities at once, tracing flows across
+    the whole set of BAs rather than only first-hop imports (see power_dashboard.flow_tracing).
+    """
+    generation_df = get_eia_grid_mix_timeseries_hourly(
+        balancing_authorities,
+        start_date=start_date,
+        end_date=end_date,
+        frequency="hourly",
+        value_dtype=value_dtype,
+    )
+    interchange_df = get_eia_interchange_timeseries_hourly(
+        balancing_authorities,
+        start_date=start_date,
+        end_date=end_date,
+        frequency="hourly",
+        value_dtype=value_dtype,
+    )
+    return consumption_carbon_intensity(
+        generation_df, interchange_df, factor_set=factor_set, bands=bands
+    )
+
+
 def co2_contrib(args):
-    fueltype = args[0]
-    percent = args[1]
-    local_fraction = args[2] / args[3]
-    if fueltype == "OIL":
-        return 840 * percent * local_fraction
-    elif fueltype == "COL":
-        return 1000 * percent * local_fraction
-    elif fueltype == "NG":
-        return 469 * percent * local_fraction
-    elif fueltype == "SUN":
-        return 46 * percent * local_fraction
-    elif fueltype == "WAT":
-        return 4 * percent * local_fraction
-    elif fueltype == "NUC":
-        return 16 * percent * local_fraction
-    elif fueltype == "WND":
-        return 12 * percent * local_fraction
-    elif fueltype == "OTH":
-        return 439 * percent * local_fraction
-    elif fueltype == "UNK":
-        return 439 * percent * local_fraction
-    elif fueltype == "BIO":
-        return 230 * percent * local_fraction
-    elif fueltype == "GEO":
-        return 42 * percent * local_fraction
-    else:
-        return 0
+    """
+    Row-wise CO2 contribution, kept for ad-hoc use.  get_co2_data_hourly uses apply_emission_factors instead.
+    """
+    fueltype, percent, consumed_locally, total_generation = args
+    factor = get_factor_set()["central"].get(fueltype, 0)
+    return factor * percent * consumed_locally / total_generation
+
 
-def get_energy_generated_and_consumed_locally(df):
-    demand_stats = df.groupby("type-name")["Demand (MWh)"].sum()
+def get_energy_generated_and_consumed_locally(demand_df):
+    """
+    Energy generated and used locally for every period in demand_df, as a Series indexed by period
+    """
+    demand_stats = (
+        demand_df.groupby(["period", "type-name"], observed=True)["Demand (MWh)"]
+        .sum()
+        .unstack("type-name")
+        .reindex(columns=["Demand", "Net generation"])
+    )
     # If local demand is smaller than net (local) generation, that means: amount generated and used locally == Demand (net export)
     # If local generation is smaller than local demand, that means: amount generated and used locally == Net generation (net import)
     # Therefore, the amount generated and used locally is the minimum of these two
-    try:
-        return min(demand_stats["Demand"], demand_stats["Net generation"])
-    except KeyError:
-        # Sometimes for a particular timestamp we're missing demand or net generation. Be conservative and set iat to zero
-        print(f'Warning - either Demand or Net generation is missing from this timestamp. Values found for "type-name": {list(demand_stats.index)}')
-        return 0
+    missing = demand_stats.isna().any(axis=1)
+    if missing.any():
+        # Sometimes for a particular timestamp we're missing demand or net generation. Be conservative and set it to zero
+        missing_periods = missing.index[missing]
+        logger.warning(
+            f"Demand or Net generation is missing for {len(missing_periods)} of {len(missing)} periods "
+            f"(set to 0), e.g. {', '.join(map(str, missing_periods[:5]))}"
+        )
+    return demand_stats.min(axis=1, skipna=False).fillna(0)
 
-def get_eia_timeseries(
+
+@span("eia.fetch_page")
+def _fetch_eia_page(
     url_segment,
     facets,
-    value_column_name="value",
-    start_date=default_start_date,
-    end_date=default_end_date,
-    start_page=0,
-    frequency="daily"
+    start_date,
+    end_date,
+    frequency,
+    offset,
 ):
     """
-    A generalized helper function to fetch data from the EIA API
+    Fetch a single page (up to EIA_MAX_ROW_COUNT rows) of an EIA API response
     """
+    api_url = f"{EIA_BASE_URL}{url_segment}/data/"
+    set_attribute("url_segment", url_segment)
 
-    max_row_count = 5000  # This is the maximum allowed per API call from the EIA
-    api_url = f"https://api.eia.gov/v2/electricity/rto/{url_segment}/data/?api_key={EIA_API_KEY}"
-    offset = start_page * max_row_count
-
-    #print(api_url)
-    #print(start_date)
-    #print(end_date)
-    #print(start_page)
-    #print(frequency)
-
-    logger.error(f"Request: {api_url} {start_date} {end_date} {start_page} {frequency}")
+    logger.debug(f"Request: {api_url} {start_date} {end_date} {offset} {frequency}")
 
-    response_content = requests.get(
-        api_url,
+    response = http_client.get(
+        f"{api_url}?api_key={get_eia_api_key()}",
         headers={
             "X-Params": json.dumps(
                 {
                     "frequency": frequency,
                     "data": ["value"],
-                    #"facets": dict(**{"timezone": ["Pacific"]}, **facets),
+                    # "facets": dict(**{"timezone": ["Pacific"]}, **facets),
                     "facets": dict(**facets),
                     "start": start_date,
                     "end": end_date,
                     "sort": [{"column": "period", "direction": "desc"}],
                     "offset": offset,
-                    "length": max_row_count,
+                    "length": EIA_MAX_ROW_COUNT,
                 }
             )
         },
-    ).json()
-
+    )
+    # Retries are exhausted by now, so a 429/5xx is final.  Not raise_for_status(): its message
+    # carries the URL, and with it the API key.
+    if response.status_code >= 400:
+        raise requests.exceptions.HTTPError(
+            f"EIA {url_segment} request failed with status {response.status_code}: {response.text[:500]}",
+            response=response,
+        )
+    response_content = response.json()
 
     # Sometimes EIA API responses are nested under a "response" key. Sometimes not 🤷 :lol
     if "response" in response_content:
         response_content = response_content["response"]
 
     if "data" in response_content:
-        print(f"{len(response_content['data'])} rows fetched")
+        set_attribute("rows", len(response_content["data"]))
+        logger.debug(
+            f"{len(response_content['data'])} rows fetched from {url_segment} at offset {offset}"
+        )
     else:
-        print(response_content)
+        logger.warning(f"Unexpected EIA response for {url_segment}: {response_content}")
 
-    # Convert the data to a Pandas DataFrame and clean it up for plotting & analysis.
-    dataframe = pd.DataFrame(response_content["data"])
-    # Add a more useful timestamp column
-    #print(dataframe)
-    #return dataframe
+    return response_content
 
-    dataframe["timestamp"] = dataframe["period"].apply(
-        pd.to_datetime, format="%Y-%m-%dT%H"
-    )
-    # Clean up the "value" column-
-    # EIA always sends the value we asked for in a column called "value"
-    # Oddly, this is sometimes sent as a string though it should always be a number.
-    # We convert its dtype and set the name to a more useful one
-    eia_value_column_name = "value"
-    processed_df = dataframe.astype({eia_value_column_name: float}).rename(
-        columns={eia_value_column_name: value_column_name}
+
+@span("eia.assemble")
+def _eia_pages_to_dataframe(
+    pages, value_column_name="value", value_dtype=EIA_VALUE_DTYPE
+):
+    """
+    Assemble page responses (in offset order) into one DataFrame in the compact EIA schema
+    """
+    # Rows from all pages are combined first so the frame is built and converted only once.
+    dataframe = pd.DataFrame([row for page in pages for row in page["data"]])
+    if dataframe.empty:
+        # e.g. a cache gap covering hours EIA has not published yet
+        dataframe = pd.DataFrame(
+            {
+                "period": pd.Series(dtype="datetime64[ns, UTC]"),
+                "value": pd.Series(dtype=float),
+            }
+        )
+    # EIA always sends the value we asked for in a column called "value"; give it a more useful name
+    dataframe = dataframe.rename(columns={"value": value_column_name})
+    return apply_eia_schema(dataframe, value_column_name, value_dtype)
+
+
+@span("eia.timeseries")
+def get_eia_timeseries(
+    url_segment,
+    facets,
+    value_column_name="value",
+    start_date=default_start_date,
+    end_date=default_end_date,
+    start_page=0,
+    frequency="daily",
+    max_workers=EIA_MAX_WORKERS,
+    value_dtype=EIA_VALUE_DTYPE,
+):
+    """
+    A generalized helper function to fetch data from the EIA API
+
+    The first page tells us the total row count; the remaining pages are then fetched concurrently
+    with up to max_workers requests in flight (max_workers=1 fetches them one after another).
+    """
+    set_attribute("url_segment", url_segment)
+    fetch_page = partial(
+        _fetch_eia_page,
+        url_segment,
+        facets,
+        start_date,
+        end_date,
+        frequency,
     )
+    first_page = fetch_page(start_page * EIA_MAX_ROW_COUNT)
 
     # Pagination logic
-    rows_fetched = len(processed_df) + offset
-    rows_total = int(response_content["total"])
-    more_rows_needed = rows_fetched != rows_total
-    if more_rows_needed:
-        # Recursive call to get remaining rows
-        additional_rows = get_eia_timeseries(
-            url_segment=url_segment,
-            facets=facets,
-            value_column_name=value_column_name,
-            start_date=start_date,
-            end_date=end_date,
-            start_page=start_page + 1,
-            frequency=frequency
-        )
-        return pd.concat([processed_df, additional_rows])
-    else:
-        return processed_df
-    
+    rows_total = int(first_page["total"])
+    remaining_offsets = range(
+        (start_page + 1) * EIA_MAX_ROW_COUNT, rows_total, EIA_MAX_ROW_COUNT
+    )
+    pages = [first_page]
+    if len(remaining_offsets) > 0:
+        with ThreadPoolExecutor(
+            max_workers=min(max_workers, len(remaining_offsets))
+        ) as executor:
+            # map() yields results in offset order regardless of which request finishes first
+            pages.extend(executor.map(propagate(fetch_page), remaining_offsets))
+
+    return _eia_pages_to_dataframe(pages, value_column_name, value_dtype)
+
+
+@span("eia.timeseries_cached")
+def get_eia_timeseries_cached(use_cache=True, **kwargs):
+    """
+    get_eia_timeseries backed by the local Parquet cache (hourly data only)
+    """
+    if use_cache and kwargs.get("frequency") == "hourly":
+        return get_default_cache().get(get_eia_timeseries, **kwargs)
+    return get_eia_timeseries(**kwargs)
+
+
 def get_eia_grid_mix_timeseries_hourly(balancing_authorities, **kwargs):
     """
     Fetch electricity generation data by fuel type
     """
-    return get_eia_timeseries(
+    return get_eia_timeseries_cached(
         url_segment="fuel-type-data",
         facets={"respondent": balancing_authorities},
         value_column_name="Generation (MWh)",
         **kwargs,
-    )    
+    )
+
 
-def get_eia_net_demand_and_generation_timeseries_hourly(balancing_authorities, **kwargs):
+def get_eia_net_demand_and_generation_timeseries_hourly(
+    balancing_authorities, **kwargs
+):
     """
     Fetch electricity demand data
     """
-    return get_eia_timeseries(
+    return get_eia_timeseries_cached(
         url_segment="region-data",
         facets={
             "respondent": balancing_authorities,
             "type": ["D", "NG", "TI"],  # Filter out the "Demand forecast" (DF) type
-            #"timezone": ["Mountain"],
+            # "timezone": ["Mountain"],
         },
         value_column_name="Demand (MWh)",
         **kwargs,
     )
 
+
 def get_eia_interchange_timeseries_hourly(balancing_authorities, **kwargs):
     """
     Fetch electricity interchange data (imports & exports from other utilities)
     """
-    return get_eia_timeseries(
+    return get_eia_timeseries_cached(
         url_segment="interchange-data",
-        facets={"toba": balancing_authorities}, #, "timezone": ["Mountain"]},
-        value_column_name=f"Interchange to local BA (MWh)",
+        facets={"toba": balancing_authorities},  # , "timezone": ["Mountain"]},
+        value_column_name="Interchange to local BA (MWh)",
         **kwargs,
-    )
\ No newline at end of file
+    )
@@ -0,0 +1,282 @@
+"""
+Persistent Parquet cache for hourly EIA API responses.
+
+Each cached series is keyed by endpoint (``url_segment``), facet values, frequency and value
+column, and stored as one Parquet file under ``EIA_CACHE_DIR/<url_segment>/``.  A JSON index
+records which hours each file covers, so a request that overlaps cached data only fetches the
+missing hours from api.eia.gov.
+
+EIA revises the most recent hours, so hours within ``revision_hours`` of the time they were
+fetched are provisional: they are served from cache for ``fresh_seconds`` and refetched after
+that.  Older hours are settled and never refetched.  When the cache grows past ``max_bytes``
+the least recently used series are evicted.
+"""
+
+import datetime
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+import pandas as pd
+
+from power_dashboard.eia_schema import EIA_VALUE_DTYPE, apply_eia_schema
+
+logger = logging.getLogger(__name__)
+
+EIA_CACHE_DIR = Path(os.getenv("EIA_CACHE_DIR", "data/interim/eia_cache"))
+EIA_CACHE_MAX_BYTES = int(os.getenv("EIA_CACHE_MAX_BYTES", 512 * 1024**2))
+EIA_REVISION_HOURS = 48
+EIA_FRESH_SECONDS = 15 * 60
+
+HOUR_FORMAT = "%Y-%m-%dT%H"
+INDEX_FILE = "index.json"
+SCHEMA_VERSION = 1  # Bump when the stored frame layout changes so stale files are ignored and evicted
+
+
+def _to_hour(value: Union[str, datetime.date, pd.Timestamp]) -> int:
+    """
+    Convert an EIA start/end value ("2024-08-01" or "2024-08-01T05") to hours since the epoch (UTC)
+    """
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert("UTC").tz_localize(None)
+    return int(timestamp.floor("h").value // 3_600_000_000_000)
+
+
+def _from_hour(hour: int) -> str:
+    return (pd.Timestamp(0) + pd.Timedelta(hours=hour)).strftime(HOUR_FORMAT)
+
+
+def _merge_intervals(intervals: list) -> list:
+    """
+    Merge overlapping or adjacent inclusive [start, end] hour intervals
+    """
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def _subtract_intervals(intervals: list, covered: list) -> list:
+    """
+    Return the parts of inclusive [start, end] intervals not overlapped by ``covered``
+    """
+    remaining = []
+    for start, end, *rest in intervals:
+        cursor = start
+        for covered_start, covered_end in _merge_intervals([c[:2] for c in covered]):
+            if covered_end < cursor or covered_start > end:
+                continue
+            if covered_start > cursor:
+                remaining.append([cursor, covered_start - 1, *rest])
+            cursor = covered_end + 1
+            if cursor > end:
+                break
+        if cursor <= end:
+            remaining.append([cursor, end, *rest])
+    return remaining
+
+
+class EIACache:
+    """
+    On-disk cache of hourly EIA timeseries with gap-only refetch and LRU eviction
+    """
+
+    def __init__(
+        self,
+        cache_dir: Union[str, Path] = EIA_CACHE_DIR,
+        max_bytes: int = EIA_CACHE_MAX_BYTES,
+        revision_hours: int = EIA_REVISION_HOURS,
+        fresh_seconds: float = EIA_FRESH_SECONDS,
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.revision_hours = revision_hours
+        self.fresh_seconds = fresh_seconds
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(
+        url_segment: str, facets: dict, frequency: str, value_column_name: str
+    ) -> str:
+        description = {
+            "url_segment": url_segment,
+            "facets": {name: sorted(values) for name, values in facets.items()},
+            "frequency": frequency,
+            "value_column_name": value_column_name,
+            "schema_version": SCHEMA_VERSION,
+        }
+        return hashlib.sha1(
+            json.dumps(description, sort_keys=True).encode()
+        ).hexdigest()[:16]
+
+    def _read_index(self) -> dict:
+        try:
+            with open(self.cache_dir / INDEX_FILE) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _write_index(self, index: dict):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.cache_dir / f"{INDEX_FILE}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.cache_dir / INDEX_FILE)
+
+    def _valid_coverage(self, entry: dict, now: float) -> list:
+        """
+        Hours of an index entry that can be served without refetching
+        """
+        fresh = [
+            interval[:2]
+            for interval in entry["provisional"]
+            if now - interval[2] < self.fresh_seconds
+        ]
+        return _merge_intervals(entry["settled"] + fresh)
+
+    def _record_fetch(self, entry: dict, start: int, end: int, now: float):
+        """
+        Mark [start, end] as fetched at ``now``, splitting it into settled and provisional hours
+        """
+        settled_until = _to_hour(pd.Timestamp(now, unit="s")) - self.revision_hours
+        if start <= settled_until:
+            entry["settled"] = _merge_intervals(
+                entry["settled"] + [[start, min(end, settled_until)]]
+            )
+        if end > settled_until:
+            provisional = [max(start, settled_until + 1), end, now]
+            entry["provisional"] = _subtract_intervals(
+                entry["provisional"], [provisional]
+            ) + [provisional]
+        entry["provisional"] = _subtract_intervals(
+            entry["provisional"], entry["settled"]
+        )
+
+    def _evict(self, index: dict, keep: str):
+        sizes = {key: entry.get("bytes", 0) for key, entry in index.items()}
+        for key in sorted(index, key=lambda k: index[k]["last_access"]):
+            if sum(sizes.values()) <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            logger.info(f"Evicting EIA cache entry {key} ({index[key]['url_segment']})")
+            (self.cache_dir / index[key]["path"]).unlink(missing_ok=True)
+            del index[key]
+            del sizes[key]
+
+    def get(
+        self,
+        fetch: Callable[..., pd.DataFrame],
+        url_segment: str,
+        facets: dict,
+        value_column_name: str,
+        start_date: str,
+        end_date: str,
+        frequency: str = "hourly",
+        value_dtype: str = EIA_VALUE_DTYPE,
+        **fetch_kwargs,
+    ) -> pd.DataFrame:
+        """
+        Return rows for [start_date, end_date], calling ``fetch`` only for hours missing from cache.
+
+        ``fetch`` takes the same arguments as ``eia_api.get_eia_timeseries``.
+        """
+        key = self.key(url_segment, facets, frequency, value_column_name)
+        start, end = _to_hour(start_date), _to_hour(end_date)
+        now = time.time()
+
+        with self._lock:
+            index = self._read_index()
+        entry = index.get(
+            key,
+            {
+                "url_segment": url_segment,
+                "facets": facets,
+                "frequency": frequency,
+                "path": f"{url_segment}/{key}.parquet",
+                "settled": [],
+                "provisional": [],
+            },
+        )
+        path = self.cache_dir / entry["path"]
+        if not path.exists():
+            # Data file evicted or deleted out from under the index
+            entry["settled"], entry["provisional"] = [], []
+        gaps = _subtract_intervals([[start, end]], self._valid_coverage(entry, now))
+        logger.debug(
+            f"EIA cache {url_segment} {key}: {len(gaps)} gap(s) in {_from_hour(start)}..{_from_hour(end)}"
+        )
+
+        fetched = [
+            fetch(
+                url_segment=url_segment,
+                facets=facets,
+                value_column_name=value_column_name,
+                start_date=_from_hour(gap_start),
+                end_date=_from_hour(gap_end),
+                frequency=frequency,
+                # The file is shared by every caller, so it always holds full precision; see the cast on read
+                value_dtype=EIA_VALUE_DTYPE,
+                **fetch_kwargs,
+            )
+            for gap_start, gap_end in gaps
+        ]
+
+        with self._lock:
+            index = self._read_index()
+            entry = index.get(key, entry)
+            if fetched:
+                cached = pd.read_parquet(path) if path.exists() else None
+                # Categories differ between pieces, so re-apply the schema after concatenating
+                combined = apply_eia_schema(
+                    pd.concat([cached] + fetched, ignore_index=True), value_column_name
+                )
+                row_key = [c for c in combined.columns if c != value_column_name]
+                combined = combined.drop_duplicates(subset=row_key, keep="last")
+                path.parent.mkdir(parents=True, exist_ok=True)
+                combined.to_parquet(path, index=False)
+                for gap_start, gap_end in gaps:
+                    self._record_fetch(entry, gap_start, gap_end, now)
+                entry["bytes"] = path.stat().st_size
+            entry["last_access"] = now
+            index[key] = entry
+            self._evict(index, keep=key)
+            self._write_index(index)
+
+        result = pd.read_parquet(
+            path,
+            filters=[
+                ("period", ">=", pd.Timestamp(_from_hour(start), tz="UTC")),
+                ("period", "<=", pd.Timestamp(_from_hour(end), tz="UTC")),
+            ],
+        )
+        result = apply_eia_schema(result, value_column_name, value_dtype)
+        return result.sort_values("period", ascending=False, ignore_index=True)
+
+    def clear(self):
+        """
+        Delete every cached series and the index
+        """
+        with self._lock:
+            for entry in self._read_index().values():
+                (self.cache_dir / entry["path"]).unlink(missing_ok=True)
+            (self.cache_dir / INDEX_FILE).unlink(missing_ok=True)
+
+
+_default_cache: Optional[EIACache] = None
+
+
+def get_default_cache() -> EIACache:
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = EIACache()
+    return _default_cache
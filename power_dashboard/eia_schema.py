@@ -0,0 +1,52 @@
+"""
+Compact in-memory schema for frames returned by the EIA API.
+
+BA, fuel and type codes (and their descriptive names) become categoricals, ``period`` becomes a
+UTC datetime, and values become ``float64`` or, optionally, ``float32``.  The schema is applied
+once when a response is turned into a DataFrame and kept through the CO2 pipeline.
+"""
+
+import pandas as pd
+
+EIA_CATEGORICAL_COLUMNS = [
+    "respondent",
+    "respondent-name",
+    "fromba",
+    "fromba-name",
+    "toba",
+    "toba-name",
+    "fueltype",
+    "type",
+    "type-name",
+    "value-units",
+]
+EIA_VALUE_DTYPE = "float64"
+
+
+def apply_eia_schema(
+    dataframe: pd.DataFrame,
+    value_column_name: str = "value",
+    value_dtype: str = EIA_VALUE_DTYPE,
+) -> pd.DataFrame:
+    """
+    Convert an EIA frame to the compact schema, in place.  Columns already converted are left alone.
+    """
+    for column in EIA_CATEGORICAL_COLUMNS:
+        if column in dataframe.columns and not isinstance(
+            dataframe[column].dtype, pd.CategoricalDtype
+        ):
+            dataframe[column] = dataframe[column].astype("category")
+
+    # Hourly periods ("2024-08-01T05") are UTC
+    if not pd.api.types.is_datetime64_any_dtype(dataframe["period"]):
+        dataframe["period"] = pd.to_datetime(
+            dataframe["period"], format="ISO8601", utc=True
+        )
+
+    # Oddly, EIA sometimes sends values as strings though they should always be numbers.
+    if dataframe[value_column_name].dtype != value_dtype:
+        dataframe[value_column_name] = pd.to_numeric(
+            dataframe[value_column_name]
+        ).astype(value_dtype)
+
+    return dataframe
@@ -4,16 +4,33 @@ from typing import Optional
 
 import requests
 
+from power_dashboard import http_client
+from power_dashboard.instrumentation import span
+
 logger = logging.getLogger(__name__)
 
-ELECTRICITYMAPS_BASE_URL = "https://api.electricitymap.org/v3/"
+ELECTRICITYMAPS_BASE_URL = os.getenv(
+    "ELECTRICITYMAPS_BASE_URL", "https://api.electricitymap.org/v3/"
+)
+
+
+def _location_query(
+    lat: Optional[float], lng: Optional[float], zone: Optional[str]
+) -> str:
+    # A zone key makes responses identical for every address in the zone, so they can be cached per zone
+    if zone is not None:
+        return f"zone={zone}"
+    if lat is None or lng is None:
+        raise ValueError("Either zone or both lat and lng are required")
+    return f"lat={lat}&lon={lng}"
 
 
+@span("electricity_maps.zones")
 def get_electricity_maps_zones():
     url = f"{ELECTRICITYMAPS_BASE_URL}zones"
 
     # Send the GET request
-    response = requests.get(url)
+    response = http_client.get(url)
 
     # Check if the request was successful
     if response.status_code == 200:
@@ -23,10 +40,14 @@ def get_electricity_maps_zones():
         raise requests.exceptions.HTTPError("Response: " + response.text)
 
 
+@span("electricity_maps.carbon_intensity")
 def get_electricity_maps_carbon_intensity(
-    lat: float, lng: float, auth_token: Optional[str] = None
+    lat: Optional[float] = None,
+    lng: Optional[float] = None,
+    auth_token: Optional[str] = None,
+    zone: Optional[str] = None,
 ):
-    url = f"{ELECTRICITYMAPS_BASE_URL}carbon-intensity/history?lat={lat}&lon={lng}"
+    url = f"{ELECTRICITYMAPS_BASE_URL}carbon-intensity/history?{_location_query(lat, lng, zone)}"
 
     if auth_token is None:
         auth_token = os.getenv("ELECTRICITYMAPS_API_KEY")
@@ -35,7 +56,7 @@ def get_electricity_maps_carbon_intensity(
     headers = {"auth-token": auth_token}
 
     # Send the GET request
-    response = requests.get(url, headers=headers)
+    response = http_client.get(url, headers=headers)
 
     # Check if the request was successful
     if response.status_code == 200:
@@ -45,10 +66,14 @@ def get_electricity_maps_carbon_intensity(
         raise requests.exceptions.HTTPError("Response: " + response.text)
 
 
+@span("electricity_maps.power_breakdown")
 def get_electricity_maps_power_breakdown(
-    lat: float, lng: float, auth_token: Optional[str] = None
+    lat: Optional[float] = None,
+    lng: Optional[float] = None,
+    auth_token: Optional[str] = None,
+    zone: Optional[str] = None,
 ):
-    url = f"{ELECTRICITYMAPS_BASE_URL}power-breakdown/latest?lat={lat}&lon={lng}"
+    url = f"{ELECTRICITYMAPS_BASE_URL}power-breakdown/latest?{_location_query(lat, lng, zone)}"
 
     if auth_token is None:
         auth_token = os.getenv("ELECTRICITYMAPS_API_KEY")
@@ -57,7 +82,7 @@ def get_electricity_maps_power_breakdown(
     headers = {"auth-token": auth_token}
 
     # Send the GET request
-    response = requests.get(url, headers=headers)
+    response = http_client.get(url, headers=headers)
 
     # Check if the request was successful
     if response.status_code == 200:
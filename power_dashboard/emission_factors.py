@@ -0,0 +1,158 @@
+"""
+Emission factor tables for converting generation by fuel type into CO2 emissions.
+
+Each factor set is a DataFrame indexed by EIA fuel code with ``low``, ``central`` and ``high``
+columns in gCO2e/kWh (equivalently kgCO2e/MWh).  Applying a set is a single vectorized
+gather, so every row of a year-long, multi-BA frame is handled in one pass.
+"""
+
+from typing import Optional, Union
+
+import numpy as np
+import pandas as pd
+
+FUEL_CODES = [
+    "OIL",
+    "COL",
+    "NG",
+    "SUN",
+    "WAT",
+    "NUC",
+    "WND",
+    "OTH",
+    "UNK",
+    "BIO",
+    "GEO",
+]
+FACTOR_COLUMNS = ["low", "central", "high"]
+DEFAULT_FACTOR_SET = "gridemissions"
+
+
+def _factor_table(factors: dict) -> pd.DataFrame:
+    """
+    Build a factor table from ``{fuel code: central}`` or ``{fuel code: (low, central, high)}``
+    """
+    rows = {
+        code: (value, value, value) if np.isscalar(value) else tuple(value)
+        for code, value in factors.items()
+    }
+    return pd.DataFrame.from_dict(
+        rows, orient="index", columns=FACTOR_COLUMNS, dtype=float
+    )
+
+
+FACTOR_SETS = {
+    # Lifecycle CO2 factors used by gridemissions.  No published range, so low == central == high.
+    # https://github.com/jdechalendar/gridemissions/blob/696838bc82c74aa40ab54206b36aec2026908a2d/src/gridemissions/emissions.py#L14-L33
+    "gridemissions": _factor_table(
+        {
+            "OIL": 840,
+            "COL": 1000,
+            "NG": 469,
+            "SUN": 46,
+            "WAT": 4,
+            "NUC": 16,
+            "WND": 12,
+            "OTH": 439,
+            "UNK": 439,
+            "BIO": 230,
+            "GEO": 42,
+        }
+    ),
+    # Lifecycle min / median / max from IPCC AR5 WGIII Annex III, Table A.III.2.
+    # Fuels without an AR5 entry (OIL, OTH, UNK) fall back to the gridemissions value.
+    "ipcc_lifecycle": _factor_table(
+        {
+            "OIL": 840,
+            "COL": (740, 820, 910),
+            "NG": (410, 490, 650),
+            "SUN": (18, 48, 180),
+            "WAT": (1, 24, 2200),
+            "NUC": (3.7, 12, 110),
+            "WND": (7, 11, 56),
+            "OTH": 439,
+            "UNK": 439,
+            "BIO": (130, 230, 420),
+            "GEO": (6, 38, 79),
+        }
+    ),
+    # Direct (stack) emissions only: zero for non-combustion and biogenic sources.
+    # Coal and gas ranges from IPCC AR5 WGIII Annex III, Table A.III.2.
+    "direct": _factor_table(
+        {
+            "OIL": 840,
+            "COL": (670, 760, 870),
+            "NG": (350, 370, 490),
+            "SUN": 0,
+            "WAT": 0,
+            "NUC": 0,
+            "WND": 0,
+            "OTH": 439,
+            "UNK": 439,
+            "BIO": 0,
+            "GEO": 0,
+        }
+    ),
+}
+
+
+def register_factor_set(name: str, factors: Union[dict, pd.DataFrame]):
+    """
+    Make a custom factor set available by name.
+
+    ``factors`` is either a DataFrame shaped like the built-in sets or a dict accepted by
+    ``_factor_table``.  Fuel codes missing from the set contribute zero emissions.
+    """
+    if isinstance(factors, pd.DataFrame):
+        table = factors.reindex(columns=FACTOR_COLUMNS).astype(float)
+    else:
+        table = _factor_table(factors)
+    if table.isna().any(axis=None):
+        raise ValueError(
+            f"Factor set {name} must define {FACTOR_COLUMNS} for every fuel code"
+        )
+    FACTOR_SETS[name] = table
+
+
+def get_factor_set(
+    factor_set: Union[str, pd.DataFrame] = DEFAULT_FACTOR_SET,
+) -> pd.DataFrame:
+    """
+    Look up a factor set by name; DataFrames are passed through unchanged
+    """
+    if isinstance(factor_set, pd.DataFrame):
+        return factor_set
+    try:
+        return FACTOR_SETS[factor_set]
+    except KeyError:
+        raise ValueError(
+            f"Unknown factor set: {factor_set}. Available: {list(FACTOR_SETS)}"
+        ) from None
+
+
+def apply_emission_factors(
+    fuel_codes: pd.Series,
+    weights: Union[pd.Series, np.ndarray, float] = 1.0,
+    factor_set: Union[str, pd.DataFrame] = DEFAULT_FACTOR_SET,
+    bands: bool = False,
+    name: Optional[str] = None,
+) -> Union[pd.Series, pd.DataFrame]:
+    """
+    Multiply ``weights`` by the emission factor of each row's fuel code.
+
+    Returns a Series of central estimates, or with ``bands=True`` a DataFrame with ``low``,
+    ``central`` and ``high`` columns computed in the same pass.  Unknown fuel codes map to zero,
+    matching the old row-wise ``co2_contrib``.
+    """
+    table = get_factor_set(factor_set)
+    codes = pd.Categorical(fuel_codes, categories=table.index).codes
+    # Code -1 (unknown fuel) indexes the trailing row of zeros
+    factors = np.vstack([table.to_numpy(), np.zeros((1, len(FACTOR_COLUMNS)))])[codes]
+    weights = np.asarray(weights, dtype=float)
+    index = fuel_codes.index if isinstance(fuel_codes, pd.Series) else None
+
+    if bands:
+        return pd.DataFrame(
+            factors * weights.reshape(-1, 1), index=index, columns=FACTOR_COLUMNS
+        )
+    return pd.Series(factors[:, 1] * weights, index=index, name=name)
@@ -0,0 +1,217 @@
+"""
+Hourly batch forecasts for every region the forecast model was trained on.
+
+Rather than each dashboard session running the model for its own region, this job runs ``predict``
+vectorized over all of the model's ``unique_id`` series (one call per timezone, since the model's date
+features are in each region's local time) and stores the forecasts, plus the lowest-intensity
+window start for every appliance run time the app offers, in Parquet.
+The app reads the stored result and only falls back to live inference when it is missing or stale.
+
+Run it hourly, e.g. from cron::
+
+    python -m power_dashboard.forecast_batch
+"""
+
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+import click
+import pandas as pd
+
+from power_dashboard.electricity_maps import get_electricity_maps_zones
+from power_dashboard.logging_config import configure_logging
+from power_dashboard.scheduling import best_windows
+from power_dashboard.supabase_history import fetch_electricitymaps_history
+
+logger = logging.getLogger(__name__)
+
+FORECAST_MODEL_PATH = "models/final_model"
+FORECAST_OUTPUT_DIR = Path(os.getenv("FORECAST_OUTPUT_DIR", "data/processed/forecasts"))
+FORECAST_HORIZON = 24
+FORECAST_MODEL_COLUMN = "LGBMRegressor"
+# Appliance run times offered by the Forecast tab's slider
+FORECAST_WINDOW_LENGTHS = range(1, 13)
+# How much Electricity Maps history feeds each series (matches the app's CARBON_INTENSITY_HISTORY)
+FORECAST_HISTORY = pd.Timedelta(days=14)
+# Stored forecasts older than this are ignored by read_batch_forecast
+FORECAST_MAX_AGE = pd.Timedelta(hours=2)
+
+
+def region_for_zone(zone: str) -> str:
+    """
+    Model unique_id for an Electricity Maps zone, e.g. US-NE-ISNE -> CO2i_ISNE_D
+    """
+    return f"CO2i_{zone.split('-')[-1]}_D"
+
+
+def zones_for_regions(regions: Iterable[str], zones: Iterable[str]) -> Dict[str, str]:
+    """
+    The Electricity Maps zone that supplies history for each region; regions without one are skipped
+    """
+    zones_by_region = {}
+    for zone in sorted(zones):
+        zones_by_region.setdefault(region_for_zone(zone), zone)
+    return {
+        region: zones_by_region[region]
+        for region in regions
+        if region in zones_by_region
+    }
+
+
+def build_forecast_input(
+    client, zones_by_region: Dict[str, str], now: pd.Timestamp
+) -> pd.DataFrame:
+    """
+    Stacked (unique_id, ds, y) history for every region, in the format MLForecast.predict expects
+    """
+    series = []
+    for region, zone in zones_by_region.items():
+        history = fetch_electricitymaps_history(
+            client, zone, start=now - FORECAST_HISTORY
+        )
+        if len(history) == 0:
+            logger.warning(f"No Electricity Maps history for {zone}; skipping {region}")
+            continue
+        series.append(
+            pd.DataFrame(
+                {
+                    "unique_id": region,
+                    "ds": pd.to_datetime(history["datetime"], utc=True),
+                    "y": history["carbonIntensity"],
+                }
+            )
+        )
+    if not series:
+        return pd.DataFrame(columns=["unique_id", "ds", "y"])
+    return pd.concat(series, ignore_index=True)
+
+
+def predict_local_time(
+    model, new_df: pd.DataFrame, h: int = FORECAST_HORIZON
+) -> pd.DataFrame:
+    """
+    ``model.predict`` with each series' ``ds`` in its region's local time, as the model's date features
+    (e.g. hour of day) were trained and as the app feeds it.  ``ds`` is UTC in new_df and the result.
+    """
+    # Imported here so the app can import this module without gridemissions
+    from power_dashboard.gridemissions_utils import TIMEZONE_MAP
+
+    unknown = set(new_df["unique_id"]) - set(TIMEZONE_MAP)
+    if unknown:
+        raise ValueError(f"No timezone for regions {sorted(unknown)}")
+    forecasts = []
+    for timezone, series in new_df.groupby(
+        new_df["unique_id"].map(TIMEZONE_MAP), sort=False
+    ):
+        forecast = model.predict(
+            h=h, new_df=series.assign(ds=series["ds"].dt.tz_convert(timezone))
+        )
+        forecast["ds"] = pd.to_datetime(forecast["ds"], utc=True)
+        forecasts.append(forecast)
+    return pd.concat(forecasts, ignore_index=True)
+
+
+def forecast_windows(
+    forecast: pd.DataFrame, lengths: Iterable[int] = FORECAST_WINDOW_LENGTHS
+) -> pd.DataFrame:
+    """
+    Lowest-mean forecast window of each length, per unique_id
+    """
+    windows = [
+        best_windows(
+            region_forecast, FORECAST_MODEL_COLUMN, "ds", lengths=lengths, by_day=False
+        ).assign(unique_id=region)
+        for region, region_forecast in forecast.groupby("unique_id", observed=True)
+    ]
+    if not windows:
+        return pd.DataFrame(columns=["unique_id", "length", "start", "end", "mean"])
+    return pd.concat(windows, ignore_index=True)[
+        ["unique_id", "length", "start", "end", "mean"]
+    ]
+
+
+def run_batch_forecast(
+    client, model, zones: Iterable[str], now: Optional[pd.Timestamp] = None
+) -> Tuple:
+    """
+    Forecast every region the model knows, in one predict call per timezone.  Returns (forecast, windows) frames.
+    """
+    now = pd.Timestamp.now(tz="UTC") if now is None else pd.Timestamp(now)
+    zones_by_region = zones_for_regions(model.ts.uids, zones)
+    X = build_forecast_input(client, zones_by_region, now)
+    if len(X) == 0:
+        raise ValueError("No history available for any region the model knows")
+
+    forecast = predict_local_time(model, X)
+    windows = forecast_windows(forecast)
+    forecast["generated_at"] = now
+    windows["generated_at"] = now
+    logger.info(
+        f"Forecast {forecast['unique_id'].nunique()} regions x {FORECAST_HORIZON} hours"
+    )
+    return forecast, windows
+
+
+def write_batch_forecast(
+    forecast: pd.DataFrame,
+    windows: pd.DataFrame,
+    output_dir: Union[str, Path] = FORECAST_OUTPUT_DIR,
+):
+    """
+    Replace the stored forecast and windows; each file is swapped in atomically
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for name, df in [("forecast", forecast), ("windows", windows)]:
+        tmp_path = output_dir / f"{name}.{os.getpid()}.tmp"
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, output_dir / f"{name}.parquet")
+
+
+def read_batch_forecast(
+    region: str,
+    max_age: pd.Timedelta = FORECAST_MAX_AGE,
+    output_dir: Union[str, Path] = FORECAST_OUTPUT_DIR,
+    now: Optional[pd.Timestamp] = None,
+) -> Optional[Tuple[pd.DataFrame, pd.DataFrame]]:
+    """
+    Stored (forecast, windows) for ``region``, or None if none younger than ``max_age`` exists
+    """
+    output_dir = Path(output_dir)
+    try:
+        forecast = pd.read_parquet(
+            output_dir / "forecast.parquet", filters=[("unique_id", "==", region)]
+        )
+        windows = pd.read_parquet(
+            output_dir / "windows.parquet", filters=[("unique_id", "==", region)]
+        )
+    except FileNotFoundError:
+        return None
+
+    now = pd.Timestamp.now(tz="UTC") if now is None else pd.Timestamp(now)
+    if len(forecast) == 0 or now - forecast["generated_at"].max() > max_age:
+        return None
+    return forecast, windows
+
+
+@click.command()
+@click.option("--model-path", default=FORECAST_MODEL_PATH, show_default=True)
+@click.option("--output-dir", default=str(FORECAST_OUTPUT_DIR), show_default=True)
+def main(model_path, output_dir):
+    # Imported here so the app can read stored forecasts without loading mlforecast or supabase
+    from mlforecast import MLForecast
+    from supabase import create_client
+
+    configure_logging("pipeline_logs/forecast_batch.log")
+    client = create_client(os.environ["SUPABASE_URL"], os.environ["SUPABASE_KEY"])
+    forecast, windows = run_batch_forecast(
+        client, MLForecast.load(model_path), get_electricity_maps_zones()
+    )
+    write_batch_forecast(forecast, windows, output_dir)
+    logger.info(f"Wrote batch forecast to {output_dir}")
+
+
+if __name__ == "__main__":
+    main()
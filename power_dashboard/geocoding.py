@@ -0,0 +1,18 @@
+import os
+from typing import Optional
+
+import googlemaps
+
+# Unset means Google's servers; set it to point the client at e.g. a local stand-in
+GOOGLEMAPS_BASE_URL = os.getenv("GOOGLEMAPS_BASE_URL")
+
+
+def get_googlemaps_client(
+    key: str, base_url: Optional[str] = GOOGLEMAPS_BASE_URL, **kwargs
+) -> googlemaps.Client:
+    """
+    googlemaps.Client that sends requests to base_url, when given, instead of Google's servers
+    """
+    if base_url is not None:
+        kwargs["base_url"] = base_url
+    return googlemaps.Client(key=key, **kwargs)
@@ -0,0 +1,170 @@
+"""
+Shared HTTP client for the external APIs (EIA, Electricity Maps).
+
+All requests go through one pooled ``requests.Session``, so connections (and their TLS sessions)
+are kept alive and reused across calls and threads.  On top of that the client adds:
+
+* a connect/read timeout per host, so a hung upstream cannot block a Streamlit session forever;
+* retries with exponential, jittered backoff on 429 and 5xx responses (honouring Retry-After);
+* conditional requests: responses with an ETag or Last-Modified are remembered and revalidated
+  with If-None-Match / If-Modified-Since, and a 304 is answered from memory;
+* per-host request counts and latency statistics (see ``latency_stats``).
+
+Responses are gzip/deflate-compressed when the server supports it (requests negotiates this by
+default).
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# (connect, read) seconds.  EIA pages of 5000 rows can take a while to generate.
+DEFAULT_TIMEOUT = (3.05, 30)
+TIMEOUTS: Dict[str, Tuple[float, float]] = {
+    "api.eia.gov": (3.05, 60),
+    "api.electricitymap.org": (3.05, 15),
+}
+RETRY = Retry(
+    total=4,
+    backoff_factor=0.5,
+    backoff_jitter=0.5,
+    status_forcelist=[429, 500, 502, 503, 504],
+    allowed_methods=["GET"],
+    respect_retry_after_header=True,
+    raise_on_status=False,
+)
+# Matches the most concurrent requests we make to one host (EIA page fetches)
+POOL_MAXSIZE = 16
+CONDITIONAL_CACHE_SIZE = 256
+# Latency percentiles are over each host's most recent requests
+MAX_LATENCY_SAMPLES = 10000
+
+_session = None
+_session_lock = threading.Lock()
+# url + relevant request headers -> response with an ETag/Last-Modified, most recently used last
+_conditional_cache: "OrderedDict[Tuple, requests.Response]" = OrderedDict()
+_conditional_lock = threading.Lock()
+_latencies: Dict[str, deque] = {}
+_requests: Dict[str, int] = {}
+_errors: Dict[str, int] = {}
+_stats_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """
+    The process-wide pooled session, created on first use
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=8, pool_maxsize=POOL_MAXSIZE, max_retries=RETRY
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+def timeout_for(url: str) -> Tuple[float, float]:
+    return TIMEOUTS.get(urlsplit(url).hostname, DEFAULT_TIMEOUT)
+
+
+def _cache_key(url: str, params: Optional[dict], headers: Optional[dict]) -> Tuple:
+    return (
+        url,
+        tuple(sorted((params or {}).items())),
+        tuple(sorted((name.lower(), value) for name, value in (headers or {}).items())),
+    )
+
+
+def _record_latency(host: str, seconds: float, failed: bool):
+    with _stats_lock:
+        _latencies.setdefault(host, deque(maxlen=MAX_LATENCY_SAMPLES)).append(seconds)
+        _requests[host] = _requests.get(host, 0) + 1
+        _errors[host] = _errors.get(host, 0) + int(failed)
+
+
+def get(
+    url: str,
+    params: Optional[dict] = None,
+    headers: Optional[dict] = None,
+    timeout: Optional[Union[float, Tuple[float, float]]] = None,
+) -> requests.Response:
+    """
+    GET ``url`` through the shared session, with retries, the host's timeout and conditional revalidation
+    """
+    key = _cache_key(url, params, headers)
+    with _conditional_lock:
+        cached = _conditional_cache.get(key)
+    request_headers = dict(headers or {})
+    if cached is not None:
+        if "ETag" in cached.headers:
+            request_headers["If-None-Match"] = cached.headers["ETag"]
+        if "Last-Modified" in cached.headers:
+            request_headers["If-Modified-Since"] = cached.headers["Last-Modified"]
+
+    host = urlsplit(url).hostname
+    start = time.perf_counter()
+    try:
+        response = get_session().get(
+            url,
+            params=params,
+            headers=request_headers,
+            timeout=timeout if timeout is not None else timeout_for(url),
+        )
+    except requests.exceptions.RequestException:
+        _record_latency(host, time.perf_counter() - start, failed=True)
+        raise
+    _record_latency(
+        host, time.perf_counter() - start, failed=response.status_code >= 400
+    )
+
+    if response.status_code == 304 and cached is not None:
+        logger.debug(f"{url} not modified; using cached response")
+        with _conditional_lock:
+            _conditional_cache.move_to_end(key)
+        return cached
+    if response.status_code == 200 and (
+        "ETag" in response.headers or "Last-Modified" in response.headers
+    ):
+        with _conditional_lock:
+            _conditional_cache[key] = response
+            _conditional_cache.move_to_end(key)
+            while len(_conditional_cache) > CONDITIONAL_CACHE_SIZE:
+                _conditional_cache.popitem(last=False)
+    return response
+
+
+def latency_stats() -> pd.DataFrame:
+    """
+    Request and error counts per host since start-up, and latency percentiles (seconds) over its last
+    MAX_LATENCY_SAMPLES requests
+    """
+    with _stats_lock:
+        rows = [
+            {
+                "host": host,
+                "requests": _requests[host],
+                "errors": _errors[host],
+                "p50": np.percentile(latencies, 50),
+                "p95": np.percentile(latencies, 95),
+                "max": max(latencies),
+            }
+            for host, latencies in _latencies.items()
+        ]
+    return pd.DataFrame(
+        rows, columns=["host", "requests", "errors", "p50", "p95", "max"]
+    )
@@ -0,0 +1,227 @@
+"""
+Timing and memory spans for the pipeline and the app.
+
+Wrap a stage in ``span`` (as a context manager or a decorator) to record its wall time, and, while
+memory tracing is on, the peak Python memory allocated inside it::
+
+    with span("eia.assemble", rows=len(rows)):
+        ...
+
+    @span("electricity_maps.carbon_intensity")
+    def get_electricity_maps_carbon_intensity(...): ...
+
+Spans nest: each record carries its parent's path (e.g. ``app.rerun/app.fetch/eia.fetch_page``).
+Finished spans are kept in memory (see ``span_records`` and ``stage_stats``), logged at DEBUG, and,
+when ``INSTRUMENTATION_JSONL`` is set, appended to that file as JSON lines.  ``write_histograms``
+writes one JSON line per stage with a latency histogram.
+
+Memory tracing uses tracemalloc, which slows Python allocations down noticeably, so it is off unless
+``INSTRUMENTATION_MEMORY=1`` or ``enable_memory_tracing()`` is called.  tracemalloc's peak is
+process-wide, so spans running concurrently in several threads share one peak.
+"""
+
+import bisect
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from pathlib import Path
+from typing import Callable, Dict, List, Union
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+INSTRUMENTATION_JSONL = os.getenv("INSTRUMENTATION_JSONL")
+INSTRUMENTATION_MEMORY = os.getenv("INSTRUMENTATION_MEMORY", "0") == "1"
+MAX_SPAN_RECORDS = 10000
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket is open-ended
+HISTOGRAM_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+)
+
+_current: contextvars.ContextVar = contextvars.ContextVar(
+    "instrumentation_span", default=None
+)
+_records: deque = deque(maxlen=MAX_SPAN_RECORDS)
+_durations: Dict[str, deque] = {}
+_histograms: Dict[str, List[int]] = {}
+_lock = threading.Lock()
+
+
+def enable_memory_tracing():
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+class span(contextlib.ContextDecorator):
+    """
+    Time a block (and its peak traced memory), nested under whichever span is current
+    """
+
+    def __init__(self, name: str, **attributes):
+        self.name = name
+        self.attributes = attributes
+
+    def _recreate_cm(self):
+        # A fresh instance per decorated call, so concurrent calls don't share timing state
+        return span(self.name, **self.attributes)
+
+    def __enter__(self):
+        parent = _current.get()
+        self._state = {
+            "parent": parent,
+            "path": f"{parent['path']}/{self.name}" if parent else self.name,
+            "peak": 0,
+            "attributes": {},
+        }
+        if tracemalloc.is_tracing():
+            # Fold the peak so far into the parent before resetting it for this span
+            current, peak = tracemalloc.get_traced_memory()
+            if parent:
+                parent["peak"] = max(parent["peak"], peak)
+            tracemalloc.reset_peak()
+            self._state["base"] = current
+        self._token = _current.set(self._state)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        duration = time.perf_counter() - self._start
+        _current.reset(self._token)
+        state = self._state
+        record = {
+            "name": self.name,
+            "path": state["path"],
+            "start": time.time() - duration,
+            "duration_s": duration,
+            "thread": threading.current_thread().name,
+            "error": exc_type.__name__ if exc_type else None,
+            **self.attributes,
+            **state["attributes"],
+        }
+        if tracemalloc.is_tracing() and "base" in state:
+            state["peak"] = max(state["peak"], tracemalloc.get_traced_memory()[1])
+            record["peak_mb"] = (state["peak"] - state["base"]) / 1024**2
+            if state["parent"]:
+                state["parent"]["peak"] = max(state["parent"]["peak"], state["peak"])
+        _record(record)
+        return False
+
+
+def propagate(func: Callable) -> Callable:
+    """
+    Wrap ``func`` to run in (a copy of) the caller's context, so spans it opens in a worker thread nest
+    under the caller's current span
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return context.copy().run(func, *args, **kwargs)
+
+    return wrapper
+
+
+def set_attribute(name: str, value):
+    """
+    Attach a value (e.g. a row count known only at the end) to the innermost open span
+    """
+    state = _current.get()
+    if state is not None:
+        state["attributes"][name] = value
+
+
+def _record(record: dict):
+    with _lock:
+        _records.append(record)
+        _durations.setdefault(record["name"], deque(maxlen=MAX_SPAN_RECORDS)).append(
+            record["duration_s"]
+        )
+        histogram = _histograms.setdefault(
+            record["name"], [0] * (len(HISTOGRAM_BUCKETS) + 1)
+        )
+        histogram[bisect.bisect_left(HISTOGRAM_BUCKETS, record["duration_s"])] += 1
+        if INSTRUMENTATION_JSONL:
+            with open(INSTRUMENTATION_JSONL, "a") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+    logger.debug(f"{record['path']} took {record['duration_s'] * 1000:.1f} ms")
+
+
+def span_records() -> pd.DataFrame:
+    """
+    The most recent finished spans, oldest first
+    """
+    with _lock:
+        return pd.DataFrame(list(_records))
+
+
+def stage_stats() -> pd.DataFrame:
+    """
+    Count, total and latency percentiles (seconds) per span name, over its last MAX_SPAN_RECORDS runs
+    """
+    with _lock:
+        rows = [
+            {
+                "stage": name,
+                "count": len(durations),
+                "total": sum(durations),
+                "p50": np.percentile(durations, 50),
+                "p95": np.percentile(durations, 95),
+                "max": max(durations),
+            }
+            for name, durations in _durations.items()
+        ]
+    return pd.DataFrame(rows, columns=["stage", "count", "total", "p50", "p95", "max"])
+
+
+def write_histograms(path: Union[str, Path]):
+    """
+    Append one JSON line per stage: its latency histogram (bucket upper bounds in seconds) and counts
+    """
+    with _lock:
+        lines = [
+            json.dumps(
+                {
+                    "time": time.time(),
+                    "stage": name,
+                    "buckets": list(HISTOGRAM_BUCKETS) + [None],
+                    "counts": counts,
+                }
+            )
+            for name, counts in _histograms.items()
+        ]
+    with open(path, "a") as f:
+        f.writelines(line + "\n" for line in lines)
+
+
+def reset():
+    with _lock:
+        _records.clear()
+        _durations.clear()
+        _histograms.clear()
+
+
+if INSTRUMENTATION_MEMORY:
+    enable_memory_tracing()
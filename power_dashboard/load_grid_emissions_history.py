@@ -1,52 +1,238 @@
 import logging
+import shutil
 from pathlib import Path
+from typing import Iterator, Optional, Union
 
+import click
 import pandas as pd
-from logging_config import configure_logging
 
-from power_dashboard.gridemissions_utils import load_bulk
+from power_dashboard.gridemissions_utils import list_bulk_files
+from power_dashboard.instrumentation import (
+    enable_memory_tracing,
+    span,
+    stage_stats,
+    write_histograms,
+)
+from power_dashboard.logging_config import configure_logging
 
 logger = logging.getLogger(__name__)
 
+# Hard-coded for now.
+BULK_FILE_DIR = Path("data/interim/gridemissions")
+PARQUET_OUTPUT_DIR = Path("data/processed/gridemissions_ts.parquet")
+CSV_OUTPUT_PATH = Path("data/processed/gridemissions_ts.csv")
 
-def load_gridemissions_history():
+# Peak memory is roughly proportional to ROW_CHUNK_SIZE x (columns in a bulk file)
+ROW_CHUNK_SIZE = 24 * 31
+COLUMN_CHUNK_SIZE = 64
+
+
+def iter_gridemissions_history(
+    bulk_file_dir: Union[str, Path] = BULK_FILE_DIR,
+    which: str = "co2i",
+    row_chunk_size: int = ROW_CHUNK_SIZE,
+    column_chunk_size: int = COLUMN_CHUNK_SIZE,
+) -> Iterator[pd.DataFrame]:
     """
-    Load gridemissions history data.
+    Yield the wide bulk CSVs as long (period, region, co2_intensity) chunks, missing values included.
+
+    Each file is read ``row_chunk_size`` rows at a time and melted ``column_chunk_size`` regions at
+    a time, so no more than one chunk of either shape is in memory at once.
     """
-    # Hard-coded for now.
-    bulk_file_dir = Path("data/interim/gridemissions")
+    for file_number, path in enumerate(sorted(list_bulk_files(bulk_file_dir, which))):
+        logger.info(f"Reading {path}")
+        for wide in pd.read_csv(
+            path, index_col=0, parse_dates=True, chunksize=row_chunk_size
+        ):
+            wide.index.name = "period"
+            for first_column in range(0, wide.shape[1], column_chunk_size):
+                long = (
+                    wide.iloc[:, first_column : first_column + column_chunk_size]
+                    .melt(
+                        ignore_index=False,
+                        var_name="region",
+                        value_name="co2_intensity",
+                    )
+                    .reset_index()
+                )
+                # period represents "UTC Time at End of Hour" (see https://github.com/jdechalendar/gridemissions/blob/696838bc82c74aa40ab54206b36aec2026908a2d/src/gridemissions/eia_bulk_grid_monitor.py#L29)
+                # We need to localize the timestamp to UTC and subtract an hour
+                # to get to the beginning of the hour.  We can then convert to specific timezones downstream.
+                long["period"] = long["period"].dt.tz_localize("UTC") - pd.Timedelta(
+                    hours=1
+                )
+                long["file_number"] = file_number
+                yield long
 
-    co2i = load_bulk(bulk_file_dir, "co2i")
-    all_ts = (
-        co2i.df.reset_index()
-        .melt(id_vars=["period"], var_name="region", value_name="CO2 Intensity")
-        .dropna()
-    )
 
-    # period represents "UTC Time at End of Hour" (see https://github.com/jdechalendar/gridemissions/blob/696838bc82c74aa40ab54206b36aec2026908a2d/src/gridemissions/eia_bulk_grid_monitor.py#L29)
-    # We need to localize the timestamp to UTC and subtract an hour
-    # to get to the beginning of the hour.  We can then convert to specific timezones downstream.
-    all_ts.period = all_ts.period.dt.tz_localize("UTC") - pd.Timedelta(hours=1)
-    logger.info(
-        f"Loaded {len(all_ts)} records for {len(all_ts.region.unique())} regions."
-    )
-    logger.info(f"Earliest timestamp: {all_ts.period.min()}")
-    logger.info(f"Latest timestamp: {all_ts.period.max()}")
+@span("gridemissions_history.read_and_partition")
+def _write_partitions(chunks: Iterator[pd.DataFrame], output_dir: Path):
+    """
+    Write chunks as Parquet fragments under output_dir/region=<region>/month=<YYYY-MM>/
+    """
+    for chunk_number, chunk in enumerate(chunks):
+        chunk["month"] = chunk["period"].dt.strftime("%Y-%m")
+        for (region, month), partition in chunk.groupby(
+            ["region", "month"], sort=False
+        ):
+            partition_dir = output_dir / f"region={region}" / f"month={month}"
+            partition_dir.mkdir(parents=True, exist_ok=True)
+            partition[["period", "co2_intensity", "file_number"]].to_parquet(
+                partition_dir / f"part-{chunk_number:06d}.parquet", index=False
+            )
 
-    all_ts.to_csv("data/processed/gridemissions_ts.csv")
-    logger.info(
-        "Manually upload data/processed/gridemissions_ts.csv to supabase as follows"
+
+@span("gridemissions_history.compact")
+def _compact_partitions(output_dir: Path) -> dict:
+    """
+    Merge each partition's fragments into one file, keeping the last bulk file's value for duplicate
+    periods (as load_bulk does) before dropping missing values.  Returns summary statistics.
+    """
+    stats = {"records": 0, "regions": set(), "earliest": None, "latest": None}
+    for partition_dir in sorted(output_dir.glob("region=*/month=*")):
+        fragments = sorted(partition_dir.glob("part-*.parquet"))
+        partition = (
+            pd.concat(
+                [pd.read_parquet(fragment) for fragment in fragments], ignore_index=True
+            )
+            .sort_values(["period", "file_number"], kind="stable")
+            .drop_duplicates(subset="period", keep="last")
+            .drop(columns="file_number")
+            .dropna()
+        )
+        for fragment in fragments:
+            fragment.unlink()
+        if len(partition) == 0:
+            partition_dir.rmdir()
+            continue
+        partition.to_parquet(
+            partition_dir / "data.parquet", index=False, compression="zstd"
+        )
+
+        stats["records"] += len(partition)
+        stats["regions"].add(partition_dir.parent.name.split("=", 1)[1])
+        earliest, latest = partition["period"].min(), partition["period"].max()
+        stats["earliest"] = (
+            earliest if stats["earliest"] is None else min(stats["earliest"], earliest)
+        )
+        stats["latest"] = (
+            latest if stats["latest"] is None else max(stats["latest"], latest)
+        )
+    return stats
+
+
+def _utc(timestamp) -> pd.Timestamp:
+    timestamp = pd.Timestamp(timestamp)
+    return (
+        timestamp.tz_localize("UTC")
+        if timestamp.tzinfo is None
+        else timestamp.tz_convert("UTC")
     )
+
+
+def read_gridemissions_ts(
+    region: Optional[str] = None,
+    start: Optional[pd.Timestamp] = None,
+    end: Optional[pd.Timestamp] = None,
+    path: Union[str, Path] = PARQUET_OUTPUT_DIR,
+) -> pd.DataFrame:
+    """
+    Read the partitioned gridemissions history, loading only the partitions that match ``region``
+    and only the row groups that overlap ``start``/``end`` (naive times are taken as UTC).
+    """
+    filters = []
+    if region is not None:
+        filters.append(("region", "==", region))
+    if start is not None:
+        filters.append(("period", ">=", _utc(start)))
+    if end is not None:
+        filters.append(("period", "<=", _utc(end)))
+    return pd.read_parquet(path, filters=filters or None).drop(columns="month")
+
+
+@span("gridemissions_history.write_csv")
+def _write_csv(parquet_dir: Path, csv_path: Path):
+    """
+    Stream the partitioned dataset into the single CSV that gets uploaded to Supabase, one
+    partition at a time with a running id.
+    """
+    next_id = 0
+    with open(csv_path, "w") as f:
+        f.write(",period,region,CO2 Intensity\n")
+        for partition_file in sorted(parquet_dir.glob("region=*/month=*/data.parquet")):
+            partition = pd.read_parquet(partition_file)
+            partition.insert(
+                1, "region", partition_file.parent.parent.name.split("=", 1)[1]
+            )
+            partition.index = range(next_id, next_id + len(partition))
+            partition.to_csv(f, header=False)
+            next_id += len(partition)
+
+
+@span("gridemissions_history.load")
+def load_gridemissions_history(
+    output_format: str = "both",
+    bulk_file_dir: Union[str, Path] = BULK_FILE_DIR,
+    parquet_dir: Union[str, Path] = PARQUET_OUTPUT_DIR,
+    csv_path: Union[str, Path] = CSV_OUTPUT_PATH,
+):
+    """
+    Load gridemissions history data.
+
+    Writes zstd-compressed Parquet partitioned by region and month (``output_format`` "parquet"),
+    the single CSV uploaded to Supabase ("csv"), or both.
+    """
+    if output_format not in ["parquet", "csv", "both"]:
+        raise ValueError(f"Unexpected value for output_format: {output_format}")
+    parquet_dir = Path(parquet_dir)
+
+    if parquet_dir.exists():
+        shutil.rmtree(parquet_dir)
+    _write_partitions(iter_gridemissions_history(bulk_file_dir), parquet_dir)
+    stats = _compact_partitions(parquet_dir)
     logger.info(
-        "psql -h aws-0-us-east-1.pooler.supabase.com -p 5432 -d postgres -U postgres.zsfmcbykdoviifsoauxs"
+        f"Loaded {stats['records']} records for {len(stats['regions'])} regions."
     )
-    logger.info("... password required ...")
-    upload_command = """
-    \copy "gridemissions-ts" ("id", "period", "region", "co2_intensity") FROM 'data/processed/gridemissions_ts.csv' DELIMITER ',' CSV HEADER;
-    """
-    logger.info(upload_command)
+    logger.info(f"Earliest timestamp: {stats['earliest']}")
+    logger.info(f"Latest timestamp: {stats['latest']}")
 
+    if output_format in ["csv", "both"]:
+        _write_csv(parquet_dir, Path(csv_path))
+        logger.info(f"Manually upload {csv_path} to supabase as follows")
+        logger.info(
+            "psql -h aws-0-us-east-1.pooler.supabase.com -p 5432 -d postgres -U postgres.zsfmcbykdoviifsoauxs"
+        )
+        logger.info("... password required ...")
+        upload_command = f"""
+        \\copy "gridemissions-ts" ("id", "period", "region", "co2_intensity") FROM '{csv_path}' DELIMITER ',' CSV HEADER;
+        """
+        logger.info(upload_command)
 
-if __name__ == "__main__":
+    if output_format == "csv":
+        shutil.rmtree(parquet_dir)
+
+
+@click.command()
+@click.option(
+    "--output-format",
+    type=click.Choice(["parquet", "csv", "both"]),
+    default="both",
+    show_default=True,
+    help="Write partitioned Parquet, the Supabase upload CSV, or both",
+)
+@click.option(
+    "--trace-memory",
+    is_flag=True,
+    help="Record each stage's peak Python memory (slower)",
+)
+def main(output_format, trace_memory):
     configure_logging("pipeline_logs/load_grid_emissions_history.log")
-    load_gridemissions_history()
+    if trace_memory:
+        enable_memory_tracing()
+    load_gridemissions_history(output_format)
+    logger.info(f"Stage timings (s):\n{stage_stats().to_string(index=False)}")
+    write_histograms("pipeline_logs/load_grid_emissions_history_stages.jsonl")
+
+
+if __name__ == "__main__":
+    main()
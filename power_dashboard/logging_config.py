@@ -1,4 +1,5 @@
 import logging
+import random
 import sys
 
 import pandas as pd
@@ -40,11 +41,19 @@ def log_dataframe(
     df: pd.DataFrame,
     description: str,
     loglevel: int = logging.INFO,
+    max_rows: int = 10,
+    sample_rate: float = 1.0,
 ):
     """
-    Convenience function to include a short dataframe result and description in logs
-    """
+    Convenience function to include a short dataframe result and description in logs.
 
-    msg = f"""{description}:
-    {str(df)}"""
+    Nothing is formatted unless the logger would emit the message, only the first and last rows (up to
+    max_rows) are shown, and with sample_rate < 1 only that fraction of calls log at all.
+    """
+    if not logger.isEnabledFor(loglevel) or (
+        sample_rate < 1 and random.random() >= sample_rate
+    ):
+        return
+    msg = f"""{description} ({len(df)} rows x {len(df.columns)} columns):
+    {df.to_string(max_rows=max_rows, max_cols=20)}"""
     logger.log(loglevel, msg)
@@ -0,0 +1,126 @@
+"""
+Vectorized search for low-carbon time windows, e.g. when to run an appliance.
+
+Values are laid out as a 2-D grid (one row per day, or a single row for a forecast) and window
+means for every start position come from one cumulative sum, so every day, every window length
+and the top-N non-overlapping windows are answered with array operations instead of a Python
+call per day.
+"""
+
+import datetime
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+WINDOW_COLUMNS = ["length", "rank", "start", "end", "mean"]
+
+
+def window_means(values: np.ndarray, length: int) -> np.ndarray:
+    """
+    Mean of every contiguous ``length``-long window along the last axis of a 2-D array.
+
+    The result has ``values.shape[1] - length + 1`` columns; windows containing NaN are NaN.
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    zeros = np.zeros((values.shape[0], 1))
+    sums = np.concatenate([zeros, np.nancumsum(values, axis=1)], axis=1)
+    missing = np.concatenate([zeros, np.cumsum(np.isnan(values), axis=1)], axis=1)
+    means = (sums[:, length:] - sums[:, :-length]) / length
+    means[(missing[:, length:] - missing[:, :-length]) > 0] = np.nan
+    return means
+
+
+def top_windows(means: np.ndarray, length: int, top_n: int = 1) -> tuple:
+    """
+    Start positions and means of the ``top_n`` lowest, mutually non-overlapping windows per row.
+
+    Returns two ``(rows, top_n)`` arrays; positions are -1 (and means NaN) where a row has fewer
+    than ``top_n`` complete windows left.
+    """
+    remaining = np.where(np.isnan(means), np.inf, means)
+    positions = np.full((means.shape[0], top_n), -1)
+    best = np.full((means.shape[0], top_n), np.nan)
+    columns = np.arange(means.shape[1])
+    rows = np.arange(means.shape[0])
+    for rank in range(top_n):
+        position = remaining.argmin(axis=1)
+        found = np.isfinite(remaining[rows, position])
+        positions[found, rank] = position[found]
+        best[found, rank] = remaining[rows[found], position[found]]
+        # Windows starting within length-1 hours of the chosen one would overlap it
+        overlaps = np.abs(columns[None, :] - position[:, None]) < length
+        remaining[found[:, None] & overlaps] = np.inf
+    return positions, best
+
+
+def best_windows(
+    df: pd.DataFrame,
+    value_col: str,
+    time_col: str,
+    lengths: Iterable[int] = (4,),
+    top_n: int = 1,
+    by_day: bool = True,
+) -> pd.DataFrame:
+    """
+    Lowest-mean contiguous windows of each length in ``lengths`` (hours) over hourly data.
+
+    With ``by_day`` the search runs independently for every calendar day of ``time_col`` (in its own
+    timezone) over the windows starting in that day's 24 hours, which may run past midnight into the
+    next day, and the result has a ``day`` column; otherwise the whole series is searched as one
+    block (e.g. a 24-hour forecast).  Each window is reported with its ``length``, ``rank`` (1 =
+    lowest), ``start`` and ``end`` times and ``mean`` value.
+    """
+    lengths = list(lengths)
+    times = pd.to_datetime(df[time_col])
+    if by_day:
+        grid_index = [times.dt.date.rename("day"), times.dt.hour.rename("hour")]
+        grouped = df.groupby(grid_index)
+        values = grouped[value_col].mean().unstack("hour").reindex(columns=range(24))
+        starts = grouped[time_col].min().unstack("hour").reindex(columns=range(24))
+        row_labels = values.index
+        # Each day's row continues into the next day's first hours, for windows crossing midnight
+        next_days = [day + datetime.timedelta(days=1) for day in row_labels]
+        spill = min(max(lengths, default=1), 24) - 1
+        values = np.hstack(
+            [values, values.reindex(next_days).to_numpy(dtype=float)[:, :spill]]
+        )
+        starts = np.hstack(
+            [starts, starts.reindex(next_days).to_numpy(dtype=object)[:, :spill]]
+        ).astype(object)
+        hours_per_row = 24
+    else:
+        order = np.argsort(times.to_numpy())
+        values = df[value_col].to_numpy()[order].reshape(1, -1)
+        starts = times.iloc[order].to_numpy(dtype=object).reshape(1, -1)
+        row_labels = None
+        hours_per_row = values.shape[1]
+
+    value_grid = np.asarray(values, dtype=float)
+    results = []
+    for length in lengths:
+        if length > hours_per_row:
+            continue
+        # Only windows starting within the row's own hours
+        means = window_means(value_grid[:, : hours_per_row + length - 1], length)
+        positions, best = top_windows(means, length, top_n)
+        row, rank = np.nonzero(positions >= 0)
+        window = pd.DataFrame(
+            {
+                "length": length,
+                "rank": rank + 1,
+                "start": pd.to_datetime(
+                    pd.Series(starts[row, positions[row, rank]], dtype=object)
+                ),
+                "mean": best[row, rank],
+            }
+        )
+        window["end"] = window["start"] + pd.to_timedelta(length, unit="h")
+        if row_labels is not None:
+            window.insert(0, "day", row_labels[row])
+        results.append(window)
+
+    columns = (["day"] if by_day else []) + WINDOW_COLUMNS
+    if not results:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(results, ignore_index=True)[columns]
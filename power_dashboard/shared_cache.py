@@ -0,0 +1,256 @@
+"""
+Cache for the app's upstream fetches that is shared by every process and survives restarts.
+
+``st.cache_data`` lives inside one Streamlit process, so each replica (and each restart) calls
+Electricity Maps, Supabase and Google again for the same zones.  ``shared_cache`` memoizes a
+function in a backend all replicas can reach:
+
+* ``SQLiteCache`` (default): a SQLite file, for replicas on one host or a shared volume;
+* ``RedisCache``: a Redis server, for replicas on several hosts (``SHARED_CACHE_URL=redis://...``).
+
+Entries can expire at the top of the hour (``expires="hour"``), after a number of seconds, or
+never, and the backends evict least recently used entries beyond their size bound.  Hits and misses
+are counted per function (see ``cache_stats``).
+
+    @shared_cache(expires="hour")
+    def get_carbon_intensity(lat, lng): ...
+
+Values are pickled, so only point the cache at storage the app trusts.
+"""
+
+import functools
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional, Union
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SHARED_CACHE_URL = os.getenv(
+    "SHARED_CACHE_URL", "sqlite:///data/interim/shared_cache.sqlite"
+)
+SHARED_CACHE_MAX_BYTES = int(os.getenv("SHARED_CACHE_MAX_BYTES", 256 * 1024**2))
+SHARED_CACHE_KEY_LOCKS = 64
+# Reads refresh an entry's LRU position at most this often, so hot entries don't turn every read into a write
+TOUCH_INTERVAL_SECONDS = 60
+# Bump when cached return values change shape so old entries are ignored
+SCHEMA_VERSION = 1
+
+_stats: Dict[str, Dict[str, int]] = {}
+_stats_lock = threading.Lock()
+
+
+def next_hour(now: Optional[float] = None) -> float:
+    """
+    Epoch seconds of the next top of the hour (UTC) after ``now``
+    """
+    now = time.time() if now is None else now
+    return (now // 3600 + 1) * 3600
+
+
+class SQLiteCache:
+    """
+    Cache entries in a SQLite file, evicting least recently used entries past ``max_bytes``
+    """
+
+    def __init__(self, path: Union[str, Path], max_bytes: int = SHARED_CACHE_MAX_BYTES):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections cannot be shared between threads, so each thread opens its own
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries "
+                "(key TEXT PRIMARY KEY, value BLOB, expires_at REAL, last_access REAL, size INTEGER)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)"
+            )
+            self._local.connection = connection
+        return connection
+
+    def get(self, key: str) -> Optional[bytes]:
+        connection = self._connection()
+        now = time.time()
+        row = connection.execute(
+            "SELECT value, expires_at, last_access FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at, last_access = row
+        if expires_at is not None and expires_at <= now:
+            connection.execute(
+                "DELETE FROM entries WHERE key = ? AND expires_at <= ?", (key, now)
+            )
+            return None
+        if now - last_access > TOUCH_INTERVAL_SECONDS:
+            connection.execute(
+                "UPDATE entries SET last_access = ? WHERE key = ?", (now, key)
+            )
+        return value
+
+    def set(self, key: str, value: bytes, expires_at: Optional[float] = None):
+        connection = self._connection()
+        now = time.time()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                (key, value, expires_at, now, len(value)),
+            )
+            connection.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+            total = connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()[0]
+            if total > self.max_bytes:
+                self._evict(connection, total - self.max_bytes)
+
+    @staticmethod
+    def _evict(connection: sqlite3.Connection, excess: int):
+        evicted = []
+        for key, size in connection.execute(
+            "SELECT key, size FROM entries ORDER BY last_access"
+        ):
+            if excess <= 0:
+                break
+            evicted.append((key,))
+            excess -= size
+        connection.executemany("DELETE FROM entries WHERE key = ?", evicted)
+        logger.info(f"Evicted {len(evicted)} shared cache entries")
+
+    def clear(self):
+        self._connection().execute("DELETE FROM entries")
+
+
+class RedisCache:
+    """
+    Cache entries in Redis, for replicas on several hosts.
+
+    Expiry uses Redis key expiry. The size bound and LRU eviction are the server's ``maxmemory`` and
+    ``maxmemory-policy allkeys-lru`` (or ``volatile-lru``) settings.
+    """
+
+    def __init__(self, url: str, prefix: str = "power_dashboard:"):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, expires_at: Optional[float] = None):
+        if expires_at is None:
+            self.client.set(self.prefix + key, value)
+        else:
+            self.client.set(self.prefix + key, value, pxat=int(expires_at * 1000))
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + "*"):
+            self.client.delete(key)
+
+
+def backend_from_url(url: str):
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisCache(url)
+    if url.startswith("sqlite:///"):
+        return SQLiteCache(url[len("sqlite:///") :])
+    raise ValueError(f"Unsupported shared cache URL: {url}")
+
+
+_default_backend = None
+_default_backend_lock = threading.Lock()
+
+
+def get_default_backend():
+    global _default_backend
+    with _default_backend_lock:
+        if _default_backend is None:
+            _default_backend = backend_from_url(SHARED_CACHE_URL)
+        return _default_backend
+
+
+def _record(name: str, outcome: str):
+    with _stats_lock:
+        counts = _stats.setdefault(name, {"hits": 0, "misses": 0, "errors": 0})
+        counts[outcome] += 1
+
+
+def shared_cache(expires: Union[str, float, None] = "hour", backend=None) -> Callable:
+    """
+    Memoize a function in the shared cache.
+
+    ``expires`` is "hour" (expire at the next top of the hour), a number of seconds, or None (kept
+    until evicted).  Arguments must have a stable ``repr``; it forms the cache key.  If the backend
+    is unreachable the function is simply called, so the cache never takes the app down.
+    """
+
+    def decorate(func: Callable) -> Callable:
+        name = f"{func.__module__}.{func.__qualname__}"
+        # Concurrent misses for the same key in this process wait for one upstream call
+        key_locks = [threading.Lock() for _ in range(SHARED_CACHE_KEY_LOCKS)]
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            cache = backend or get_default_backend()
+            arguments = repr((args, sorted(kwargs.items())))
+            key = f"{name}:{hashlib.sha1(f'{SCHEMA_VERSION}:{arguments}'.encode()).hexdigest()}"
+            with key_locks[int(key[-8:], 16) % SHARED_CACHE_KEY_LOCKS]:
+                try:
+                    cached = cache.get(key)
+                except Exception:
+                    logger.exception(f"Shared cache read failed for {name}")
+                    _record(name, "errors")
+                    cached = None
+                if cached is not None:
+                    _record(name, "hits")
+                    return pickle.loads(cached)
+
+                _record(name, "misses")
+                result = func(*args, **kwargs)
+                if expires == "hour":
+                    expires_at = next_hour()
+                elif expires is None:
+                    expires_at = None
+                else:
+                    expires_at = time.time() + expires
+                try:
+                    cache.set(
+                        key,
+                        pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL),
+                        expires_at,
+                    )
+                except Exception:
+                    logger.exception(f"Shared cache write failed for {name}")
+                    _record(name, "errors")
+                return result
+
+        return wrapper
+
+    return decorate
+
+
+def cache_stats() -> pd.DataFrame:
+    """
+    Hits, misses, backend errors and hit rate per cached function since start-up
+    """
+    with _stats_lock:
+        rows = [{"function": name, **counts} for name, counts in _stats.items()]
+    stats = pd.DataFrame(rows, columns=["function", "hits", "misses", "errors"])
+    stats["hit_rate"] = stats["hits"] / (stats["hits"] + stats["misses"]).where(
+        lambda total: total > 0
+    )
+    return stats
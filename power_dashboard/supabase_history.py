@@ -0,0 +1,193 @@
+"""
+Windowed, paged reads of the history tables the dashboard keeps in Supabase.
+
+Queries push the time window and column list down to PostgREST and page through results with
+keyset pagination on ``id``, so the cost of a read depends on the window asked for rather than on
+how long data has been collected.
+"""
+
+import logging
+import os
+from pathlib import Path
+from typing import Optional, Union
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+ELECTRICITYMAPS_TABLE = "electricitymaps-hourly"
+# Each electricitymaps-hourly row is a snapshot of the zone's trailing 24h history, written when fetched
+SNAPSHOT_TIME_COLUMN = "created_at"
+SNAPSHOT_HISTORY_HOURS = 24
+
+GRIDEMISSIONS_TABLE = "gridemissions-ts"
+GRIDEMISSIONS_COLUMNS = ["id", "period", "region", "co2_intensity"]
+# Optional local copy of gridemissions-ts, one Parquet file per region, topped up with new rows only.
+# Off unless set, e.g. GRIDEMISSIONS_MIRROR_DIR=data/interim/gridemissions_mirror
+GRIDEMISSIONS_MIRROR_DIR = os.getenv("GRIDEMISSIONS_MIRROR_DIR")
+
+PAGE_SIZE = 1000  # PostgREST's default max-rows
+
+
+def fetch_electricitymaps_history(
+    client,
+    zone: str,
+    start: pd.Timestamp,
+    end: Optional[pd.Timestamp] = None,
+    page_size: int = PAGE_SIZE,
+) -> pd.DataFrame:
+    """
+    Carbon intensity history for ``zone`` between ``start`` and ``end`` (UTC), from stored snapshots.
+
+    Only snapshots that can contain hours in the window are requested, and only their ``history``
+    array.  Pages are deduplicated as they arrive, keeping the most recently updated record for
+    each hour, so memory is bounded by the number of hours in the window.
+    """
+    start = pd.Timestamp(start)
+    end = pd.Timestamp(end) if end is not None else None
+
+    latest = {}
+    last_id = None
+    while True:
+        query = (
+            client.table(ELECTRICITYMAPS_TABLE)
+            .select("id, history:carbon_intensity_raw->history")
+            .eq("testing", False)
+            .eq("zone", zone)
+            .gte(SNAPSHOT_TIME_COLUMN, start.isoformat())
+        )
+        if end is not None:
+            query = query.lte(
+                SNAPSHOT_TIME_COLUMN,
+                (end + pd.Timedelta(hours=SNAPSHOT_HISTORY_HOURS)).isoformat(),
+            )
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        rows = query.order("id").limit(page_size).execute().data
+
+        for row in rows:
+            for record in row["history"] or []:
+                record_time = pd.Timestamp(record["datetime"])
+                if record_time < start or (end is not None and record_time > end):
+                    continue
+                previous = latest.get(record["datetime"])
+                if previous is None or pd.Timestamp(record["updatedAt"]) > pd.Timestamp(
+                    previous["updatedAt"]
+                ):
+                    latest[record["datetime"]] = record
+
+        if len(rows) < page_size:
+            break
+        last_id = rows[-1]["id"]
+
+    logger.info(
+        f"Loaded {len(latest)} hours of {ELECTRICITYMAPS_TABLE} history for {zone}"
+    )
+    history = pd.DataFrame.from_records(list(latest.values()))
+    if len(history) == 0:
+        return history
+    datetime_cols = ["datetime", "createdAt", "updatedAt"]
+    history[datetime_cols] = history[datetime_cols].apply(pd.to_datetime)
+    return history.sort_values("datetime", ignore_index=True)
+
+
+def fetch_gridemissions_history(
+    client,
+    region: str,
+    start: Optional[pd.Timestamp] = None,
+    end: Optional[pd.Timestamp] = None,
+    after_id: Optional[int] = None,
+    page_size: int = PAGE_SIZE,
+) -> pd.DataFrame:
+    """
+    Rows of gridemissions-ts for ``region`` with ``start <= period <= end`` and ``id > after_id``
+    """
+    pages = []
+    last_id = after_id
+    while True:
+        query = (
+            client.table(GRIDEMISSIONS_TABLE)
+            .select(", ".join(GRIDEMISSIONS_COLUMNS))
+            .eq("region", region)
+        )
+        if start is not None:
+            query = query.gte("period", pd.Timestamp(start).isoformat())
+        if end is not None:
+            query = query.lte("period", pd.Timestamp(end).isoformat())
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        rows = query.order("id").limit(page_size).execute().data
+        pages.extend(rows)
+        if len(rows) < page_size:
+            break
+        last_id = rows[-1]["id"]
+
+    logger.info(f"Loaded {len(pages)} rows of {GRIDEMISSIONS_TABLE} for {region}")
+    history = pd.DataFrame.from_records(pages, columns=GRIDEMISSIONS_COLUMNS)
+    history["period"] = pd.to_datetime(history["period"], utc=True)
+    return history
+
+
+def latest_gridemissions_period(client, region: str) -> Optional[pd.Timestamp]:
+    rows = (
+        client.table(GRIDEMISSIONS_TABLE)
+        .select("period")
+        .eq("region", region)
+        .order("period", desc=True)
+        .limit(1)
+        .execute()
+        .data
+    )
+    return pd.Timestamp(rows[0]["period"]) if rows else None
+
+
+def read_gridemissions_history(
+    client,
+    region: str,
+    window: Optional[pd.Timedelta] = None,
+    mirror_dir: Optional[Union[str, Path]] = GRIDEMISSIONS_MIRROR_DIR,
+) -> pd.DataFrame:
+    """
+    gridemissions-ts history for ``region``, indexed by id and ordered by period.
+
+    ``window`` limits the result to that much history before the region's latest period (the table
+    is a static backfill, so the window is anchored to the data rather than to today).  With a
+    ``mirror_dir`` (by default GRIDEMISSIONS_MIRROR_DIR, which is unset, so no mirror) the rows are
+    kept in a local Parquet file and only rows with a higher id than any mirrored row are requested;
+    ids increase with period within a region.  A mirror holds history from the window of its first
+    load onwards, so delete it to widen the window.
+    """
+    mirror_path = (
+        Path(mirror_dir) / f"{region}.parquet" if mirror_dir is not None else None
+    )
+    mirrored = (
+        pd.read_parquet(mirror_path)
+        if mirror_path is not None and mirror_path.exists()
+        else None
+    )
+
+    if mirrored is not None and len(mirrored) > 0:
+        new_rows = fetch_gridemissions_history(
+            client, region, after_id=int(mirrored["id"].max())
+        )
+    else:
+        start = None
+        if window is not None:
+            latest = latest_gridemissions_period(client, region)
+            start = latest - window if latest is not None else None
+        new_rows = fetch_gridemissions_history(client, region, start=start)
+
+    history = (
+        pd.concat([mirrored, new_rows], ignore_index=True)
+        if mirrored is not None
+        else new_rows
+    )
+    if mirror_path is not None and len(new_rows) > 0:
+        mirror_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = mirror_path.with_suffix(f".{os.getpid()}.tmp")
+        history.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, mirror_path)
+
+    if window is not None and len(history) > 0:
+        history = history[history["period"] >= history["period"].max() - window]
+    return history.sort_values("period").set_index("id")
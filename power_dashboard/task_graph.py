@@ -0,0 +1,131 @@
+"""
+Run a set of dependent calls concurrently, each starting as soon as its inputs are ready.
+
+    graph = TaskGraph()
+    graph.add("location", geocode_address, address)
+    graph.add("intensity", lambda location: get_carbon_intensity(location["lat"], location["lng"]), deps=["location"])
+    graph.add("breakdown", lambda location: get_power_breakdown(location["lat"], location["lng"]), deps=["location"])
+    graph.start()
+    graph["intensity"]  # blocks until that task (and only what it depends on) has finished
+
+Each task is called with the results of its ``deps`` (in order) followed by its own arguments, so
+end-to-end latency is the longest dependency chain rather than the sum of all calls.
+"""
+
+import contextvars
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TASK_GRAPH_MAX_WORKERS = 8
+
+
+class TaskGraph:
+    def __init__(
+        self,
+        max_workers: int = TASK_GRAPH_MAX_WORKERS,
+        initializer: Optional[Callable] = None,
+        initargs: Tuple = (),
+    ):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="task-graph",
+            initializer=initializer,
+            initargs=initargs,
+        )
+        self._tasks: Dict[str, Tuple[Callable, List[str], tuple, dict]] = {}
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._submitted = set()
+        self._started = False
+        self._context = None
+
+    def add(
+        self, name: str, func: Callable, *args, deps: Iterable[str] = (), **kwargs
+    ) -> "TaskGraph":
+        if self._started:
+            raise RuntimeError("Cannot add tasks to a TaskGraph that has started")
+        if name in self._tasks:
+            raise ValueError(f"Duplicate task name: {name}")
+        self._tasks[name] = (func, list(deps), args, kwargs)
+        self._futures[name] = Future()
+        return self
+
+    def _submit_ready(self):
+        """
+        Submit every task whose dependencies have all finished and that has not been submitted yet
+        """
+        with self._lock:
+            ready = [
+                name
+                for name, (_, deps, _, _) in self._tasks.items()
+                if name not in self._submitted
+                and all(self._futures[dep].done() for dep in deps)
+            ]
+            self._submitted.update(ready)
+        for name in ready:
+            # Tasks run in a copy of the context the graph was started in (e.g. the caller's instrumentation span)
+            self._executor.submit(self._context.copy().run, self._run, name)
+
+    def _run(self, name: str):
+        func, deps, args, kwargs = self._tasks[name]
+        future = self._futures[name]
+        failed = [dep for dep in deps if self._futures[dep].exception() is not None]
+        if failed:
+            future.set_exception(
+                RuntimeError(f"Task {name} not run because {', '.join(failed)} failed")
+            )
+        else:
+            try:
+                future.set_result(
+                    func(
+                        *[self._futures[dep].result() for dep in deps], *args, **kwargs
+                    )
+                )
+            except BaseException as e:
+                logger.exception(f"Task {name} failed")
+                future.set_exception(e)
+        if all(future.done() for future in self._futures.values()):
+            # Let the workers exit; callers never need to shut the graph down
+            self._executor.shutdown(wait=False)
+        else:
+            self._submit_ready()
+
+    def _check(self):
+        unknown = {dep for _, deps, _, _ in self._tasks.values() for dep in deps} - set(
+            self._tasks
+        )
+        if unknown:
+            raise ValueError(f"Unknown dependencies: {', '.join(sorted(unknown))}")
+        resolved = set()
+        remaining = {name: set(deps) for name, (_, deps, _, _) in self._tasks.items()}
+        while remaining:
+            ready = [name for name, deps in remaining.items() if deps <= resolved]
+            if not ready:
+                raise ValueError(
+                    f"Dependency cycle among: {', '.join(sorted(remaining))}"
+                )
+            resolved.update(ready)
+            for name in ready:
+                del remaining[name]
+
+    def start(self) -> "TaskGraph":
+        self._check()
+        self._context = contextvars.copy_context()
+        self._started = True
+        self._submit_ready()
+        return self
+
+    def future(self, name: str) -> Future:
+        return self._futures[name]
+
+    def __getitem__(self, name: str) -> Any:
+        """
+        Result of task ``name``, waiting for it if needed; re-raises the task's exception
+        """
+        if not self._started:
+            self.start()
+        return self._futures[name].result()
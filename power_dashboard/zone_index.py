@@ -0,0 +1,225 @@
+"""
+Offline lookup of the Electricity Maps zone and timezone for a coordinate.
+
+Zone geometries come from the Electricity Maps world GeoJSON (``download_zone_geometries`` DVC
+stage), restricted to the zones in the ``data/raw/electricitymaps_zones.json`` snapshot, and are
+indexed by ``python -m power_dashboard.zone_index`` (``build_zone_index`` stage).
+
+The index buckets every zone into the 1-degree cells its outline's bounding box touches, and keeps,
+per zone and 1-degree latitude band, only the polygon edges that cross that band.  A lookup is
+then an even-odd ray cast over a few dozen edges of the one or two zones whose boxes cover the
+point, so it takes microseconds however detailed the coastlines are.
+
+Timezones come from timezonefinder, memoized per exact coordinate: rounding to a grid cell could
+hand addresses near a timezone border their neighbour's timezone.
+"""
+
+import json
+import logging
+import math
+import os
+import pickle
+from collections import defaultdict
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+import click
+import numpy as np
+
+from power_dashboard.logging_config import configure_logging
+
+logger = logging.getLogger(__name__)
+
+ZONE_GEOMETRIES_PATH = Path(
+    os.getenv("ZONE_GEOMETRIES_PATH", "data/raw/electricitymaps_world.geojson")
+)
+ZONES_SNAPSHOT_PATH = Path(
+    os.getenv("ZONES_SNAPSHOT_PATH", "data/raw/electricitymaps_zones.json")
+)
+ZONE_INDEX_PATH = Path(os.getenv("ZONE_INDEX_PATH", "data/processed/zone_index.pkl"))
+CELL_DEGREES = 1.0
+TIMEZONE_CACHE_SIZE = 65536
+
+
+def read_zones_snapshot(path: Union[str, Path] = ZONES_SNAPSHOT_PATH) -> Optional[dict]:
+    """
+    The saved response of the Electricity Maps /zones endpoint, or None if it hasn't been downloaded
+    """
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _feature_rings(geometry: dict) -> List[np.ndarray]:
+    """
+    Every ring (outer boundaries and holes) of a Polygon or MultiPolygon as (n, 2) lng/lat arrays
+    """
+    if geometry["type"] == "Polygon":
+        polygons = [geometry["coordinates"]]
+    elif geometry["type"] == "MultiPolygon":
+        polygons = geometry["coordinates"]
+    else:
+        raise ValueError(f"Unsupported geometry type: {geometry['type']}")
+    return [
+        np.asarray(ring, dtype=float)[:, :2] for polygon in polygons for ring in polygon
+    ]
+
+
+class ZoneIndex:
+    """
+    Point-in-polygon index of zone outlines on a regular lat/lng grid
+    """
+
+    def __init__(
+        self,
+        shapes: Iterable[Tuple[str, List[np.ndarray]]],
+        cell_degrees: float = CELL_DEGREES,
+    ):
+        self.cell_degrees = cell_degrees
+        self.zones: List[str] = []
+        # (cell row, cell column) -> candidate shapes; (shape, cell row) -> edges as (x1, y1, x2, y2) columns
+        self.cells: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        self.band_edges: Dict[Tuple[int, int], np.ndarray] = {}
+        for shape, (zone, rings) in enumerate(shapes):
+            self.zones.append(zone)
+            edges = np.concatenate(
+                [np.hstack([ring[:-1], ring[1:]]) for ring in rings if len(ring) > 1]
+            )
+            for ring in rings:
+                west, south = ring.min(axis=0)
+                east, north = ring.max(axis=0)
+                for row in range(self._cell(south), self._cell(north) + 1):
+                    for column in range(self._cell(west), self._cell(east) + 1):
+                        if shape not in self.cells[(row, column)]:
+                            self.cells[(row, column)].append(shape)
+            low = np.minimum(edges[:, 1], edges[:, 3])
+            high = np.maximum(edges[:, 1], edges[:, 3])
+            for row in range(self._cell(low.min()), self._cell(high.max()) + 1):
+                band = (low < (row + 1) * cell_degrees) & (high >= row * cell_degrees)
+                if band.any():
+                    self.band_edges[(shape, row)] = np.ascontiguousarray(edges[band])
+        self.cells = dict(self.cells)
+
+    def _cell(self, degrees: float) -> int:
+        return math.floor(degrees / self.cell_degrees)
+
+    def _contains(self, shape: int, lat: float, lng: float) -> bool:
+        edges = self.band_edges.get((shape, self._cell(lat)))
+        if edges is None:
+            return False
+        x1, y1, x2, y2 = edges.T
+        straddles = (y1 > lat) != (y2 > lat)
+        if not straddles.any():
+            return False
+        x1, y1, x2, y2 = x1[straddles], y1[straddles], x2[straddles], y2[straddles]
+        crossings = x1 + (lat - y1) * (x2 - x1) / (y2 - y1)
+        return bool(np.count_nonzero(crossings > lng) % 2)
+
+    def zone_at(self, lat: float, lng: float) -> Optional[str]:
+        """
+        The zone whose outline contains (lat, lng), or None if the point is outside every zone
+        """
+        for shape in self.cells.get((self._cell(lat), self._cell(lng)), ()):
+            if self._contains(shape, lat, lng):
+                return self.zones[shape]
+        return None
+
+    @classmethod
+    def from_geojson(
+        cls,
+        path: Union[str, Path] = ZONE_GEOMETRIES_PATH,
+        zones: Optional[Set[str]] = None,
+        zone_property: str = "zoneName",
+    ) -> "ZoneIndex":
+        """
+        Index the features of a GeoJSON FeatureCollection, keeping only ``zones`` if given
+        """
+        with open(path) as f:
+            features = json.load(f)["features"]
+        shapes = []
+        for feature in features:
+            zone = feature["properties"].get(zone_property)
+            if zone is None or (zones is not None and zone not in zones):
+                continue
+            shapes.append((zone, _feature_rings(feature["geometry"])))
+        if zones is not None:
+            missing = zones - {zone for zone, _ in shapes}
+            if missing:
+                logger.info(
+                    f"{len(missing)} zones have no geometry, e.g. {', '.join(sorted(missing)[:5])}"
+                )
+        logger.info(f"Indexed {len(shapes)} zone outlines from {path}")
+        return cls(shapes)
+
+    def save(self, path: Union[str, Path] = ZONE_INDEX_PATH):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load(path: Union[str, Path] = ZONE_INDEX_PATH) -> "ZoneIndex":
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+
+def load_zone_index(
+    index_path: Union[str, Path] = ZONE_INDEX_PATH,
+    geometries_path: Union[str, Path] = ZONE_GEOMETRIES_PATH,
+    zones_path: Union[str, Path] = ZONES_SNAPSHOT_PATH,
+) -> Optional[ZoneIndex]:
+    """
+    The built index, else one built from the raw geometries, else None when neither has been downloaded
+    """
+    if Path(index_path).exists():
+        return ZoneIndex.load(index_path)
+    if Path(geometries_path).exists():
+        zones = read_zones_snapshot(zones_path)
+        return ZoneIndex.from_geojson(
+            geometries_path, zones=set(zones) if zones else None
+        )
+    logger.warning(f"No zone index at {index_path} or geometries at {geometries_path}")
+    return None
+
+
+_timezone_finder = None
+
+
+@lru_cache(maxsize=TIMEZONE_CACHE_SIZE)
+def timezone_at(lat: float, lng: float) -> Optional[str]:
+    """
+    IANA timezone at (lat, lng), memoized on the exact coordinates (geocoded addresses repeat exactly)
+    """
+    global _timezone_finder
+    if _timezone_finder is None:
+        from timezonefinder import TimezoneFinder
+
+        _timezone_finder = TimezoneFinder()
+    return _timezone_finder.timezone_at(lng=lng, lat=lat)
+
+
+@click.command()
+@click.option("--geometries-path", default=ZONE_GEOMETRIES_PATH, show_default=True)
+@click.option("--zones-path", default=ZONES_SNAPSHOT_PATH, show_default=True)
+@click.option("--output-path", default=ZONE_INDEX_PATH, show_default=True)
+def main(geometries_path, zones_path, output_path):
+    configure_logging("pipeline_logs/zone_index.log")
+    zones = read_zones_snapshot(zones_path)
+    if zones is None:
+        raise click.ClickException(
+            f"No zones snapshot at {zones_path}; run the download_zones stage first"
+        )
+    index = ZoneIndex.from_geojson(geometries_path, zones=set(zones))
+    index.save(output_path)
+    logger.info(
+        f"Wrote zone index with {len(index.zones)} outlines and {len(index.cells)} cells to {output_path}"
+    )
+
+
+if __name__ == "__main__":
+    main()